@@ -6,91 +6,142 @@ import sys
 import shlex # For safely splitting command strings
 import os
 import json # For parsing Gemini's response
+import functools
+import itertools
+import re
+import concurrent.futures
 import logging # Added for logging
 from datetime import datetime, date # Added date for auto-purge
 from collections import deque # Added for conversation history
+from typing import Iterable
+
+# JSON (de)serialization of Gemini responses; orjson is an optional speedup (not a listed requirement), json the fallback.
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so existing except clauses still apply.
+try:
+    import orjson
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_dumps = json.JSONEncoder().encode
+    _json_loads = json.JSONDecoder().decode
 
 # Determine the project root directory, assuming KIT.py is in KIT/
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if PROJECT_ROOT not in sys.path:
-    sys.path.append(PROJECT_ROOT)
-    KIT_DIR = os.path.dirname(os.path.abspath(__file__))
-    if KIT_DIR not in sys.path:
-        sys.path.append(KIT_DIR)
-
-from gemini_client import get_gemini_response, GeminiClientError
-from logger_utils import setup_kit_loggers
-
-# Import necessary functions for auto-purge
-from KITCore.tools.settings_tool import get_setting as tool_get_setting, set_setting as tool_set_setting
-from KITCore.tools.note_tool import purge_deleted_notes as tool_purge_deleted_notes
-
-agent_logger = None
-trace_logger = None
+KIT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(KIT_DIR)
+# Both are needed: PROJECT_ROOT for `KITCore.*`, KIT_DIR for the sibling gemini_client/logger_utils modules.
+for _path in (PROJECT_ROOT, KIT_DIR):
+    if _path not in sys.path:
+        sys.path.append(_path)
+
+# gemini_client, logger_utils and the KITCore tools are imported inside the functions that use them,
+# so importing this module (or exiting early) does not pay for the Gemini SDK or the database layer.
+
+# Module loggers; they discard records until setup_kit_loggers() attaches handlers in main().
+agent_logger = logging.getLogger("KIT_Agent")
+agent_logger.addHandler(logging.NullHandler())
+trace_logger = logging.getLogger("KIT_Trace")
+trace_logger.addHandler(logging.NullHandler())
+_LAST_PURGE_CHECK_DATE = None # Date (ISO) on which this process last confirmed the daily purge was done
 
 MAX_HISTORY_TURNS = 5
 KITCORE_EXEC_ERROR_RETURN_CODE = -999
+STARTUP_SETTING_KEYS = ["trace_logging_enabled", "user_name", "ai_model_preference", "last_auto_purge_date", "default_purge_days"]
+
+# Settings read during this process, keyed by setting name. Values are str/int/None only.
+_settings_cache: dict = {}
+
+def _cached_get_setting(key: str):
+    if key not in _settings_cache:
+        from KITCore.tools.settings_tool import get_setting as tool_get_setting
+        _settings_cache[key] = tool_get_setting(key)
+    return _settings_cache[key]
+
+def _cached_get_settings(keys: list[str]) -> dict:
+    missing_keys = [key for key in keys if key not in _settings_cache]
+    if missing_keys:
+        from KITCore.tools.settings_tool import get_settings as tool_get_settings
+        _settings_cache.update(tool_get_settings(missing_keys))
+    return {key: _settings_cache[key] for key in keys}
+
+def _cached_set_setting(key: str, value) -> bool:
+    """Writes through to the settings table; the cached entry is dropped so the next read
+    picks up the stored (type-converted) value."""
+    from KITCore.tools.settings_tool import set_setting as tool_set_setting
+    success = tool_set_setting(key, value)
+    if success:
+        _settings_cache.pop(key, None)
+    return success
+
+_today_iso_cache = (None, None) # (date, date.isoformat()) for the last day seen
+
+def _get_today_iso() -> str:
+    """Returns today's date as YYYY-MM-DD, reformatting only when the day changes."""
+    global _today_iso_cache
+    today = date.today()
+    if _today_iso_cache[0] != today:
+        _today_iso_cache = (today, today.isoformat())
+    return _today_iso_cache[1]
+
+def run_automatic_daily_purge(settings: dict | None = None):
+    """Checks if an automatic daily purge is needed and runs it.
+    `settings` may carry values already read at startup to avoid re-querying them."""
+    global _LAST_PURGE_CHECK_DATE
+    today_str = _get_today_iso()
+    if _LAST_PURGE_CHECK_DATE == today_str:
+        return
+    agent_logger.info("Performing automatic daily purge check...")
 
-def run_automatic_daily_purge():
-    """Checks if an automatic daily purge is needed and runs it."""
-    if agent_logger:
-        agent_logger.info("Performing automatic daily purge check...")
+    if settings is not None:
+        last_purge_date = settings.get("last_auto_purge_date")
     else:
-        print("Performing automatic daily purge check...")
-
-    today_str = date.today().isoformat()
-    last_purge_date = tool_get_setting("last_auto_purge_date")
+        last_purge_date = _cached_get_setting("last_auto_purge_date")
 
     if last_purge_date == today_str:
-        msg = "Automatic daily purge already performed today."
-        if agent_logger: agent_logger.info(msg)
-        else: print(msg)
+        _LAST_PURGE_CHECK_DATE = today_str
+        agent_logger.info("Automatic daily purge already performed today.")
         return
 
-    default_days_to_purge = tool_get_setting("default_purge_days")
+    if settings is not None:
+        default_days_to_purge = settings.get("default_purge_days")
+    else:
+        default_days_to_purge = _cached_get_setting("default_purge_days")
 
     if default_days_to_purge is None:
-        msg = "Automatic daily purge skipped: 'default_purge_days' setting is not configured."
-        if agent_logger: agent_logger.info(msg)
-        else: print(msg)
+        agent_logger.info("Automatic daily purge skipped: 'default_purge_days' setting is not configured.")
         return
     
     if not isinstance(default_days_to_purge, int) or default_days_to_purge < 0:
-        msg = f"Automatic daily purge skipped: 'default_purge_days' setting ('{default_days_to_purge}') is invalid (must be a non-negative integer)."
-        if agent_logger: agent_logger.warning(msg)
-        else: print(msg, file=sys.stderr)
+        agent_logger.warning("Automatic daily purge skipped: 'default_purge_days' setting ('%s') is invalid (must be a non-negative integer).", default_days_to_purge)
         return
 
     try:
         # agent_logger.info(f"Attempting automatic purge for notes older than {default_days_to_purge} days.")
         # The purge_deleted_notes function from note_tool will print its own success/failure/count messages to stdout/stderr.
         # We rely on those messages for user feedback for the purge itself.
-        purged_count = tool_purge_deleted_notes(older_than_days=default_days_to_purge)
+        from KITCore.tools.note_tool import has_soft_deleted_notes as tool_has_soft_deleted_notes, purge_deleted_notes as tool_purge_deleted_notes
+        if tool_has_soft_deleted_notes():
+            purged_count = tool_purge_deleted_notes(older_than_days=default_days_to_purge)
+        else:
+            purged_count = 0 # Nothing is soft-deleted; skip the purge but still record today's check
         
         if purged_count >= 0: # Assuming 0 or more is success, negative might be an error code if API changes
-            msg = f"Automatic daily purge check: {purged_count} note lineage(s) older than {default_days_to_purge} days were purged."
-            if agent_logger: agent_logger.info(msg)
-            else: print(msg)
+            agent_logger.info("Automatic daily purge check: %s note lineage(s) older than %s days were purged.", purged_count, default_days_to_purge)
             # Update last purge date only if the operation was considered successful by the tool
-            if not tool_set_setting("last_auto_purge_date", today_str):
-                err_msg = "Critical: Automatic purge ran, but failed to update 'last_auto_purge_date' setting!"
-                if agent_logger: agent_logger.error(err_msg)
-                else: print(err_msg, file=sys.stderr)
+            if not _cached_set_setting("last_auto_purge_date", today_str):
+                agent_logger.error("Critical: Automatic purge ran, but failed to update 'last_auto_purge_date' setting!")
+            else:
+                _LAST_PURGE_CHECK_DATE = today_str
         else:
             # This path might not be reachable if purge_deleted_notes always returns >= 0 or raises error
-            msg = f"Automatic daily purge check: Purge operation reported an issue (returned {purged_count})."
-            if agent_logger: agent_logger.warning(msg)
-            else: print(msg, file=sys.stderr)
+            agent_logger.warning("Automatic daily purge check: Purge operation reported an issue (returned %s).", purged_count)
 
     except Exception as e:
         # Catch unexpected errors during the purge or setting update
-        err_msg = f"Error during automatic daily purge: {e}"
-        if agent_logger: agent_logger.error(err_msg, exc_info=True)
-        else: print(err_msg, file=sys.stderr)
+        agent_logger.error("Error during automatic daily purge: %s", e, exc_info=True)
 
-def get_kit_static_help_message() -> str:
-    """Returns the static help message for KIT commands."""
-    help_text = '''Here's what I can do:
+KIT_STATIC_HELP_MESSAGE = '''Here's what I can do:
   - **Create a new note:** `add --content \"<note_content>\" [--tags \"<tag1,tag2,...>\"] [--props '{{ \"key\":\"value\" }}']`
     Example: `add --content \"Buy milk\" --tags \"shopping,urgent\"`
   - **Find notes:** `find [--tags \"<tag1,tag2,...>\"] [--keywords \"<keyword1,keyword2,...>\"] [--start_date \"YYYY-MM-DD HH:MM:SS\"] [--end_date \"YYYY-MM-DD HH:MM:SS\"]`
@@ -119,24 +170,44 @@ def get_kit_static_help_message() -> str:
   - **Import notes from file:** `import-notes --file \"<filepath.json>\"` (Warning: Best used on a fresh database!)
     Example: `import-notes --file \"my_notes_backup.json\"`
   - **Initialize the database (usually not needed by user):** `initdb`'''
-    return help_text
 
-def get_gemini_master_prompt(user_name: str | None = None, conversation_history: deque = None) -> str:
-    user_name_guidance = "If you knew the user\\'s name (e.g., User_Name), you would use it (e.g., 'Hello, User_Name!')."
-    if user_name:
-        user_name_guidance = f"The user\\'s name is '{user_name}'. When appropriate (like in a greeting), you should use their name. (e.g., 'Hello, {user_name}!)."
+# Static head of the help Q&A prompt, built once. The conversation history is appended after it so this
+# (help documentation included) stays an identical prefix on every Q&A call.
+_QNA_PROMPT_BODY = '''You are an assistant tasked with answering the user\'s latest question from the CONVERSATION HISTORY.
+Base your answer *only* on the provided KIT system help documentation and the CONVERSATION HISTORY.
+Your primary goal is to help the user understand how to interact with the KIT agent using natural language or by providing command examples if appropriate.
 
-    history_block = ""
-    if conversation_history:
-        history_items = []
-        for turn in conversation_history:
-            role = "User" if turn["role"] == "user" else "Assistant"
-            content_str = str(turn['content']).replace('"', '\\\\"') # Escaping for JSON within prompt
-            history_items.append(f"{role}: {content_str}")
-        if history_items:
-            history_block = "CONVERSATION HISTORY (Use this for context on the current query):\\\\n" + "\\\\n".join(history_items) + "\\\\n\\\\n"
-
-    prompt = f"""{history_block}You are an intelligent assistant interpreting commands for the KIT system. \\\\
+--- KIT HELP DOCUMENTATION START ---
+''' + KIT_STATIC_HELP_MESSAGE + '''
+--- KIT HELP DOCUMENTATION END ---
+
+The user's question to answer is the last user message in the CONVERSATION HISTORY below.
+Analyze the USER'S QUESTION (from history) and the KIT HELP DOCUMENTATION carefully.
+
+Your response should EITHER be a natural language explanation OR a direct command example, based on the following STRICT criteria:
+
+1.  **CRITERIA FOR PROVIDING A DIRECT COMMAND EXAMPLE:**
+    *   Only provide a direct command example if the USER'S QUESTION (from history) uses phrases like: "show me the command for...", "what is the exact command to...", "give me the syntax for...", "command example for...", or explicitly asks for a "terminal command", "CLI syntax", or similar. Consider the context from the history.
+    *   If these specific phrases are present, AND the context from history makes it clear WHICH command they are referring to, provide the relevant command example(s) from the documentation. Frame it as giving an example of the command. If the command is ambiguous even with history, ask for clarification.
+
+2.  **CRITERIA FOR PROVIDING NATURAL LANGUAGE GUIDANCE (Default Behavior):**
+    *   For ALL OTHER questions about how to perform a task (e.g., "How do I filter notes?", "What's the way to add a tag?", "How can I find notes by tag?"), you MUST explain how the user can ask the KIT agent (you) to perform the action in natural language.
+    *   DO NOT just output the raw CLI command in these cases unless criteria 1 is met.
+    *   Instead, use the information in the documentation to formulate a sentence describing the natural language query. For example, if the documentation for finding notes by tag is `find --tags "<tag1>,<tag2>"`, and the user asks "How can I find notes by tag?", you should respond with something like: "You can ask me to find notes by specific tags. For instance, say: 'Find notes tagged project_alpha and urgent'."
+
+- Frame your answer as if you are the KIT agent itself.
+- Base your answer *only* on the provided KIT HELP DOCUMENTATION and CONVERSATION HISTORY.
+- If the answer cannot be found in the documentation, or if the command is still ambiguous, state that clearly.
+
+'''
+
+def get_kit_static_help_message() -> str:
+    """Returns the static help message for KIT commands."""
+    return KIT_STATIC_HELP_MESSAGE
+
+# Static instructions only; everything that changes per turn (history, date, query) goes in
+# render_dynamic_suffix() so the long prefix is byte-identical across turns and cacheable.
+_MASTER_PROMPT_TEMPLATE = """You are an intelligent assistant interpreting commands for the KIT system. \\\\
 The user will provide a natural language query. Your task is to understand the query, \\\\
 considering the CONVERSATION HISTORY if provided, \\\\
 and respond with a JSON object that specifies the action(s) to be taken by KITCore.py, or indicates a conversational interaction.
@@ -189,7 +260,7 @@ Structure 2: Multiple Sequential Actions (Use when the user\\'s query clearly im
 **Intent and Command Mapping (Applies to single actions or actions within `actions_list`):**
 - If the query maps to a KITCore tool, set `intent` to the corresponding tool name (e.g., `find_notes`, `add_note`, `update_note`, `add_tag`, `remove_tag`, `soft_delete_note`, `restore_note`, `get_note_history`, `list_deleted_notes`, `list_all_tags`, `purge_deleted_notes`, `export_notes`, `import_notes`, `init_db`). Set `kit_core_command` to the CLI command name (e.g., `find`, `add`, `update`, `add-tag`, `list-all-tags`, etc.) and `parameters` appropriately. **IMPORTANT: The keys in the `parameters` JSON object MUST be the base parameter names (e.g., `tags`, `content`, `original_id`, `new_content`, `file`), NOT the CLI flags (e.g., do NOT use `--tags` as a key).** `response_text` (for single action structure) should be null.
   - For `find` intent: Use only `tags`, `keywords`, `start_date`, `end_date` as parameter keys. DO NOT use `original_id`.
-    **Relative Date Handling for `find`:** (Assume current date is **{{{{current_date_iso_for_gemini_do_not_modify}}}}** for calculations)
+    **Relative Date Handling for `find`:** (Assume current date is the **CURRENT DATE** given after these instructions for calculations)
     When the user uses relative date expressions (e.g., "yesterday", "today", "last Tuesday", "this morning", "last week", "this month", "last year") for `find` queries, you MUST convert these into absolute `YYYY-MM-DD HH:MM:SS` timestamps for `--start_date` and/or `--end_date`.
     - "today": Start of today to end of today.
     - "yesterday": Start of yesterday to end of yesterday.
@@ -201,7 +272,7 @@ Structure 2: Multiple Sequential Actions (Use when the user\\'s query clearly im
     - "last month": Start of the first day of last month to end of the last day of last month.
     - "last year": Start of Jan 1st of last year to end of Dec 31st of last year.
     - For specific days like "last Tuesday", calculate the date. If time is not specified, assume the whole day (00:00:00 to 23:59:59).
-    - Always use the provided `{{{{current_date_iso_for_gemini_do_not_modify}}}}` as the reference for "now" when making these calculations.
+    - Always use the provided CURRENT DATE as the reference for "now" when making these calculations.
   - For `update` intent: Use for changing `new_content`, or `new_props`. If changing tags, if the user wants to set a *list* of tags (potentially replacing all existing ones), use `update --new_tags \\\\\"<tag1,tag2>\\\\\"`. If the user wants to add or remove a *single* tag, prefer the `add-tag` or `remove-tag` commands.
   - For `add-tag` intent: Use when the user explicitly asks to add a single tag to a note. Requires `original_id` and `tag` (string for the tag to add) parameters.
   - For `remove-tag` intent: Use when the user explicitly asks to remove a single tag from a note. Requires `original_id` and `tag` (string for the tag to remove) parameters.
@@ -247,64 +318,311 @@ Structure 2: Multiple Sequential Actions (Use when the user\\'s query clearly im
 - Convert user tag lists (e.g. [\\\\\"tag1\\\\\", \\\\\"tag2\\\\\"]) into a comma-separated string (e.g. \\\\\"tag1,tag2\\\\\") for the `add` and `update --new_tags` commands.
 - The `find` command is for general searching. For specific tag additions/removals, use `add-tag` or `remove-tag`.
 - If the user asks to delete a note, assume `soft-delete` unless they explicitly ask to `purge`.
-User Query to process now:
 """
-    return prompt
+
+@functools.lru_cache(maxsize=8)
+def _get_user_name_guidance(user_name: str | None) -> str:
+    if user_name:
+        return f"The user\\'s name is '{user_name}'. When appropriate (like in a greeting), you should use their name. (e.g., 'Hello, {user_name}!)."
+    return "If you knew the user\\'s name (e.g., User_Name), you would use it (e.g., 'Hello, User_Name!')."
+
+# Escaping for JSON within prompt, applied once per turn by _render_history_turn
+_HISTORY_ESCAPE_TABLE = str.maketrans({'"': '\\\\"'})
+
+def _render_history_turn(role: str, content) -> str:
+    """Renders one conversation turn as it appears in the master prompt's history block."""
+    role_label = "User" if role == "user" else "Assistant"
+    content_str = str(content).translate(_HISTORY_ESCAPE_TABLE)
+    return f"{role_label}: {content_str}"
+
+def _render_qna_history_turn(role: str, content) -> str:
+    """
+    Renders one conversation turn as it appears in the help Q&A prompt's history block.
+    The Q&A prompt is built by plain concatenation, so the content needs no escaping.
+    """
+    role_label = "User" if role == "user" else "Assistant"
+    return f"{role_label}: {content}"
+
+def append_history_turn(rendered_history: deque, qna_rendered_history: deque, role: str, content):
+    """Renders a turn once for the master prompt history and once for the help Q&A history."""
+    rendered_history.append(_render_history_turn(role, content))
+    qna_rendered_history.append(_render_qna_history_turn(role, content))
+
+def prior_turns_context(rendered_history: deque) -> str:
+    """
+    The rendered turns before the current user query (the last turn), as the response caches' context.
+    A cached answer was generated from the whole history, so it is only reused when the earlier turns match.
+    """
+    return "\n".join(itertools.islice(rendered_history, max(len(rendered_history) - 1, 0)))
+
+@functools.lru_cache(maxsize=4)
+def get_static_master_prefix(user_name: str | None = None) -> str:
+    """The fixed instruction block of the master prompt; identical for every turn of a session."""
+    return _MASTER_PROMPT_TEMPLATE.format(user_name_guidance=_get_user_name_guidance(user_name))
+
+def render_dynamic_suffix(rendered_history: Iterable[str] | None = None, current_date_iso: str | None = None, query: str = "") -> str:
+    """
+    The per-turn tail of the master prompt: history, current date and the user's query.
+    `rendered_history` may be any iterable of pre-rendered turns (normally the bounded deque kept by main()).
+    """
+    history_block = ""
+    joined_history = "\\\\n".join(rendered_history) if rendered_history is not None else ""
+    if joined_history:
+        history_block = "CONVERSATION HISTORY (Use this for context on the current query):\\\\n" + joined_history + "\\\\n\\\\n"
+    return f"\n{history_block}CURRENT DATE: {current_date_iso or _get_today_iso()}\nUser Query to process now:\n{query}"
+
+def get_gemini_master_prompt(user_name: str | None = None, rendered_history: Iterable[str] | None = None, current_date_iso: str | None = None, query: str = "") -> str:
+    return get_static_master_prefix(user_name) + render_dynamic_suffix(rendered_history, current_date_iso, query)
+
+# KITCore subprocesses always use the same script path and environment.
+_KIT_CORE_PATH = os.path.join(PROJECT_ROOT, "KITCore.py")
+_KITCORE_SUBPROC_ENV = {**os.environ, "PYTHONPATH": PROJECT_ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+
+# KITCore commands that only read notes; consecutive ones in an actions_list can run concurrently.
+# export-notes is not one of them: it writes its output file, so two exports must not overlap.
+READ_ONLY_KIT_CORE_COMMANDS = frozenset({"find", "history", "list-deleted", "list-all-tags"})
+
+def build_kit_core_args(kit_core_cmd_name: str, parameters: dict) -> list[str]:
+    """Flattens a command name and its parameters into KITCore CLI arguments (`cmd --key value ...`)."""
+    return [kit_core_cmd_name, *[arg for param, value in parameters.items()
+                                 for arg in (f"--{param}", value if type(value) is str else str(value))]]
+
+def plan_action_waves(actions_list: list[dict]) -> list[list[int]]:
+    """
+    Groups actions_list indices into waves that can each be executed together.
+    Consecutive read-only commands share a wave; any other action (writes, or actions
+    without a command) is a wave of its own, so writes keep their original ordering.
+    """
+    waves = []
+    for i, action_item in enumerate(actions_list):
+        is_read_only = action_item.get("kit_core_command") in READ_ONLY_KIT_CORE_COMMANDS
+        if is_read_only and waves and waves[-1][1]:
+            waves[-1][0].append(i)
+        else:
+            waves.append(([i], is_read_only))
+    return [indices for indices, _ in waves]
+
+def execute_kit_core_commands(commands_args: list[list[str]]) -> list[tuple[str, str, int]]:
+    """Runs independent KITCore commands concurrently (one process each) and returns their results in order."""
+    if len(commands_args) <= 1:
+        return [execute_kit_core_command(command_args) for command_args in commands_args]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(commands_args), os.cpu_count() or 1)) as executor:
+        return list(executor.map(execute_kit_core_command, commands_args))
 
 def execute_kit_core_command(command_args: list[str]) -> tuple[str, str, int]:
-    kit_core_path = os.path.join(PROJECT_ROOT, "KITCore.py")
-    env = os.environ.copy()
-    env["PYTHONPATH"] = PROJECT_ROOT + os.pathsep + env.get("PYTHONPATH", "")
     try:
         process = subprocess.run(
-            [sys.executable, kit_core_path] + command_args,
-            capture_output=True, text=True, check=False, cwd=PROJECT_ROOT, env=env
+            [sys.executable, _KIT_CORE_PATH] + command_args,
+            capture_output=True, text=True, check=False, cwd=PROJECT_ROOT, env=_KITCORE_SUBPROC_ENV
         )
         return process.stdout, process.stderr, process.returncode
     except FileNotFoundError:
-        if agent_logger: agent_logger.error(f"KITCore.py not found at {kit_core_path}")
-        return "", f"Error: KITCore.py not found at {kit_core_path}", 1
+        agent_logger.error("KITCore.py not found at %s", _KIT_CORE_PATH)
+        return "", f"Error: KITCore.py not found at {_KIT_CORE_PATH}", 1
     except Exception as e:
-        if agent_logger: agent_logger.error(f"An unexpected error occurred in execute_kit_core_command: {e}")
+        agent_logger.error("An unexpected error occurred in execute_kit_core_command: %s", e)
         return "", f"An unexpected error occurred: {e}", 1
 
+# Tone-specific wording for format_kit_response; tones not listed fall back to the defaults used there.
+_ERROR_PREFIXES = {"formal": "An error was encountered: ", "concise": "Error: "}
+_SUCCESS_PREFIXES = {"formal": "The requested operation was successful:\\n"}
+_NO_OUTPUT_MESSAGES = {
+    "friendly": "Okay, consider it done! Looks like everything went smoothly.",
+    "helpful": "Okay, consider it done! Looks like everything went smoothly.",
+    "formal": "The command executed successfully with no direct output.",
+    "concise": "Command executed successfully.",
+}
+
+# Matches a response wrapped in a markdown code fence (```json / ```text / bare ```, closing fence optional)
+# and captures the payload inside it.
+_FENCE_RE = re.compile(r'^\s*```(?:json|[\w+-]*[ \t]*\n)?(.*?)(?:\n?```)?\s*$', re.DOTALL)
+
+def _strip_markdown_fence(text: str) -> str:
+    """Returns the text inside a surrounding markdown code fence, or the stripped text if there is none."""
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text.strip()
+
 def format_kit_response(kit_core_stdout: str, kit_core_stderr: str, returncode: int, tone: str | None) -> str:
     output_message = ""
     processed_tone = tone.lower() if tone else "concise"
     if returncode == KITCORE_EXEC_ERROR_RETURN_CODE:
         output_message = f"I encountered a critical problem trying to run my core functions: {kit_core_stderr.strip()}. Please check the logs."
     elif kit_core_stderr:
-        error_prefix = ""
-        if processed_tone == "formal": error_prefix = "An error was encountered: "
-        elif processed_tone == "concise": error_prefix = "Error: "
-        output_message = f"{error_prefix}{kit_core_stderr.strip()}"
+        output_message = f"{_ERROR_PREFIXES.get(processed_tone, '')}{kit_core_stderr.strip()}"
     elif kit_core_stdout:
-        success_prefix = ""
-        if processed_tone == "formal": success_prefix = "The requested operation was successful:\\n"
-        output_message = f"{success_prefix}{kit_core_stdout.strip()}"
+        output_message = f"{_SUCCESS_PREFIXES.get(processed_tone, '')}{kit_core_stdout.strip()}"
     elif returncode == 0:
-        if processed_tone in ["friendly", "helpful"]: output_message = "Okay, consider it done! Looks like everything went smoothly."
-        elif processed_tone == "formal": output_message = "The command executed successfully with no direct output."
-        else: output_message = "Command executed successfully."
+        output_message = _NO_OUTPUT_MESSAGES.get(processed_tone, "Command executed successfully.")
     else:
         output_message = f"The operation finished with exit code {returncode}. Details might be in KITCore's output or logs."
     return output_message
 
-def get_current_user_name() -> str | None:
-    if agent_logger: agent_logger.info("Checking for user name...")
-    else: print("Checking for user name...")
-    # Use the direct tool_get_setting for internal use in KIT.py for user_name
-    name = tool_get_setting("user_name") 
+def get_current_user_name(settings: dict | None = None) -> str | None:
+    agent_logger.info("Checking for user name...")
+    name = settings.get("user_name") if settings is not None else _cached_get_setting("user_name")
     if name:
-        if agent_logger: agent_logger.info(f"Found user name: {name}")
-        else: print(f"Found user name: {name}")
+        agent_logger.info("Found user name: %s", name)
         return name
-    if agent_logger: agent_logger.info("User name not found in settings.")
-    else: print("User name not found in settings.")
+    agent_logger.info("User name not found in settings.")
     return None
 
+# --- Gemini response handlers ---
+# Each takes the parsed Gemini JSON and the per-session state dict built in main()
+# ("ai_model", "qna_rendered_history", "qna_answer_cache"), prints the reply and
+# returns the text to record as the assistant's turn in the conversation history.
+
+def _handle_show_help(gemini_response_json: dict, session: dict) -> str:
+    agent_logger.info("Gemini returned SHOW_HELP intent.")
+    print(KIT_STATIC_HELP_MESSAGE)
+    return KIT_STATIC_HELP_MESSAGE
+
+def _handle_help_qna(gemini_response_json: dict, session: dict) -> str:
+    agent_logger.info("Gemini returned ANSWER_FROM_HELP_CONTENT_REQUEST intent.")
+    original_user_question = gemini_response_json.get("response_text")
+    if not original_user_question:
+        agent_logger.error("ANSWER_FROM_HELP_CONTENT_REQUEST intent received, but no original_user_question (response_text) was found in Gemini's JSON.")
+        fallback_message = "I was going to look up the answer to your question in the help content, but I seem to have lost the original question. Please try again."
+        print(fallback_message)
+        return fallback_message
+
+    agent_logger.info("Original question for help Q&A: %s", original_user_question)
+    qna_answer_cache = session["qna_answer_cache"]
+    qna_rendered_history = session["qna_rendered_history"]
+    qna_context = prior_turns_context(qna_rendered_history)
+    cached_qna_answer = qna_answer_cache.get(original_user_question, qna_context)
+    if cached_qna_answer is not None:
+        agent_logger.info("Using cached Q&A answer for: %s", original_user_question)
+        qna_answer_text, qna_error_message = cached_qna_answer, None
+    else:
+        from gemini_client import get_gemini_response # Already imported by main() before the first turn
+        # qna_rendered_history already includes the current user query that triggered this Q&A
+        # One join so the multi-KB static body is copied once, not once per concatenation
+        secondary_qna_prompt = "".join([_QNA_PROMPT_BODY, "CONVERSATION HISTORY:\n", "\n".join(qna_rendered_history), "\n"]) if qna_rendered_history else _QNA_PROMPT_BODY
+        if trace_logger.isEnabledFor(logging.DEBUG):
+            trace_logger.debug("Secondary Q&A prompt to Gemini:\n%s", secondary_qna_prompt)
+        qna_answer_text, qna_error_message = get_gemini_response(secondary_qna_prompt, model_name=session["ai_model"], logger=agent_logger)
+
+    if trace_logger.isEnabledFor(logging.DEBUG):
+        trace_logger.debug("Gemini Q&A raw response text: %s", qna_answer_text)
+        if qna_error_message:
+            trace_logger.debug("Gemini Q&A error message: %s", qna_error_message)
+
+    if qna_error_message:
+        agent_logger.error("Error from Gemini client during Q&A call: %s", qna_error_message)
+        error_message_to_user = f"Sorry, I encountered an issue while trying to answer your question using the help content: {qna_error_message}"
+        print(error_message_to_user)
+        return error_message_to_user
+    if not qna_answer_text:
+        agent_logger.error("Received no response text from Gemini for Q&A call.")
+        no_answer_message = "Sorry, I tried to look that up in the help content but didn't get an answer back. Please try rephrasing or ask a different question."
+        print(no_answer_message)
+        return no_answer_message
+
+    # Strip the markdown fence Gemini sometimes wraps its Q&A response in
+    cleaned_qna_answer = _strip_markdown_fence(qna_answer_text)
+    agent_logger.info("Gemini Q&A answer: %s", cleaned_qna_answer)
+    if cached_qna_answer is None:
+        qna_answer_cache.put(original_user_question, qna_answer_text, qna_context)
+    print(cleaned_qna_answer)
+    return cleaned_qna_answer
+
+def _handle_actions_list(gemini_response_json: dict, session: dict) -> str:
+    actions_list = gemini_response_json["actions_list"]
+    output_tone = gemini_response_json.get("output_tone", "concise")
+    agent_logger.info("Gemini returned multiple actions: %s actions.", len(actions_list))
+    all_actions_successful = True
+    aggregated_responses = []
+    for wave in plan_action_waves(actions_list):
+        wave_args = []
+        for i in wave:
+            action_item = actions_list[i]
+            agent_logger.info("Executing action %s/%s: intent='%s', command='%s', params=%s", i+1, len(actions_list), action_item.get("intent"), action_item.get("kit_core_command"), action_item.get("parameters", {}))
+            if action_item.get("kit_core_command"):
+                wave_args.append(build_kit_core_args(action_item["kit_core_command"], action_item.get("parameters", {})))
+                if trace_logger.isEnabledFor(logging.DEBUG): trace_logger.debug("Executing KITCore command (action %s): %s", i+1, wave_args[-1])
+        # Read-only actions in the same wave run concurrently; results are reported in order.
+        wave_results = iter(execute_kit_core_commands(wave_args))
+        wave_output_start = len(aggregated_responses)
+        for i in wave:
+            action_item = actions_list[i]
+            kit_core_cmd_name = action_item.get("kit_core_command")
+            if kit_core_cmd_name:
+                response_stdout, response_stderr, returncode = next(wave_results)
+                if trace_logger.isEnabledFor(logging.DEBUG):
+                    trace_logger.debug("KITCore stdout (action %s): %s", i+1, response_stdout.strip())
+                    trace_logger.debug("KITCore stderr (action %s): %s", i+1, response_stderr.strip())
+                    trace_logger.debug("KITCore returncode (action %s): %s", i+1, returncode)
+                formatted_response = format_kit_response(response_stdout, response_stderr, returncode, output_tone)
+                aggregated_responses.append(formatted_response)
+                if returncode != 0:
+                    agent_logger.error("Action %s ('%s') failed. Stopping sequence.", i+1, kit_core_cmd_name)
+                    all_actions_successful = False
+                    break
+            else:
+                agent_logger.warning("Action %s in actions_list has no kit_core_command. Intent: %s", i+1, action_item.get("intent"))
+                response_text = action_item.get("response_text", "I found an action I couldn't process.")
+                aggregated_responses.append(response_text)
+        # The whole wave finishes together, so its output goes to the terminal in one write.
+        if len(aggregated_responses) > wave_output_start:
+            print("\n".join(aggregated_responses[wave_output_start:]))
+        if not all_actions_successful:
+            break
+    if not all_actions_successful: agent_logger.info("One or more actions in the sequence failed.")
+    else: agent_logger.info("All actions in sequence executed successfully.")
+    return "\\n".join(aggregated_responses)
+
+def _handle_kit_core_command(gemini_response_json: dict, session: dict) -> str:
+    kit_core_cmd_name = gemini_response_json["kit_core_command"]
+    parameters = gemini_response_json.get("parameters", {})
+    agent_logger.info("Gemini returned single action: intent='%s', command='%s', params=%s", gemini_response_json.get("intent"), kit_core_cmd_name, parameters)
+    command_to_run_args = build_kit_core_args(kit_core_cmd_name, parameters)
+    if trace_logger.isEnabledFor(logging.DEBUG): trace_logger.debug("Executing KITCore command: %s", command_to_run_args)
+    response_stdout, response_stderr, returncode = execute_kit_core_command(command_to_run_args)
+    if trace_logger.isEnabledFor(logging.DEBUG):
+        trace_logger.debug("KITCore stdout: %s", response_stdout.strip())
+        trace_logger.debug("KITCore stderr: %s", response_stderr.strip())
+        trace_logger.debug("KITCore returncode: %s", returncode)
+    formatted_response = format_kit_response(response_stdout, response_stderr, returncode, gemini_response_json.get("output_tone", "concise"))
+    print(formatted_response)
+    if returncode == 0: agent_logger.info("KITCore command '%s' executed successfully.", kit_core_cmd_name)
+    else: agent_logger.warning("KITCore command '%s' finished with return code %s.", kit_core_cmd_name, returncode)
+    return formatted_response
+
+def _handle_conversational_response(gemini_response_json: dict, session: dict) -> str:
+    response_text = gemini_response_json["response_text"]
+    agent_logger.info("Gemini returned conversational response: intent='%s'", gemini_response_json.get("intent"))
+    if trace_logger.isEnabledFor(logging.DEBUG): trace_logger.debug("Response text from Gemini: %s", response_text)
+    print(response_text)
+    return response_text
+
+def _handle_unrecognized_response(gemini_response_json: dict, session: dict) -> str:
+    agent_logger.warning("Gemini response JSON did not match expected structures (no SHOW_HELP, actions_list, kit_core_command, or response_text).")
+    fallback_message = "I'm not sure how to proceed with that response. Please try rephrasing."
+    print(fallback_message)
+    return fallback_message
+
+# Intents with a dedicated handler; any other intent is dispatched on the shape of the response.
+_INTENT_HANDLERS = {
+    "SHOW_HELP": _handle_show_help,
+    "ANSWER_FROM_HELP_CONTENT_REQUEST": _handle_help_qna,
+}
+
+def dispatch_gemini_response(gemini_response_json: dict, session: dict) -> str:
+    """Runs the handler for a parsed Gemini response and returns the assistant's reply for the history."""
+    handler = _INTENT_HANDLERS.get(gemini_response_json.get("intent"))
+    if handler is None:
+        if gemini_response_json.get("actions_list"):
+            handler = _handle_actions_list
+        elif gemini_response_json.get("kit_core_command"):
+            handler = _handle_kit_core_command
+        elif gemini_response_json.get("response_text"):
+            handler = _handle_conversational_response
+        else:
+            handler = _handle_unrecognized_response
+    return handler(gemini_response_json, session)
+
+
 def main():
-    global agent_logger, trace_logger
     run_timestamp_str = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     print("KIT Agent starting...")
     print(f"Run timestamp: {run_timestamp_str}")
@@ -312,12 +630,12 @@ def main():
 
     trace_enabled_this_session = False
     prompt_for_trace_setting = True
+    # Read every setting needed at startup in one query
+    startup_settings = _cached_get_settings(STARTUP_SETTING_KEYS)
     print("Checking for existing trace logging setting...")
-    trace_setting_stdout, trace_setting_stderr, trace_setting_rc = execute_kit_core_command(
-        ["get_setting", "--key", "trace_logging_enabled"]
-    )
-    if trace_setting_rc == 0 and trace_setting_stdout and trace_setting_stdout.startswith("trace_logging_enabled: "):
-        current_trace_setting = trace_setting_stdout.split(": ", 1)[1].strip().lower()
+    current_trace_setting = startup_settings.get("trace_logging_enabled")
+    if isinstance(current_trace_setting, str):
+        current_trace_setting = current_trace_setting.strip().lower()
         if current_trace_setting == "true":
             trace_enabled_this_session = True
             prompt_for_trace_setting = False
@@ -328,13 +646,7 @@ def main():
             print(f"Trace logging is DISABLED based on saved preference.")
         else:
             print(f"Found invalid trace logging setting: '{current_trace_setting}'. Will ask for preference.")
-    elif trace_setting_rc == KITCORE_EXEC_ERROR_RETURN_CODE:
-        print(f"Critical failure trying to get trace_logging_enabled setting. Defaulting to DISABLED and will not prompt for safety.", file=sys.stderr)
-        trace_enabled_this_session = False
-        prompt_for_trace_setting = False
     else:
-        if trace_setting_stderr:
-             print(f"Note: Could not retrieve trace_logging_enabled setting from KITCore: {trace_setting_stderr.strip()}")
         print("Trace logging setting not found. Will ask for preference.")
 
     if prompt_for_trace_setting:
@@ -347,14 +659,10 @@ def main():
             print(f"Trace logging for this session will be: {'ENABLED' if trace_enabled_this_session else 'DISABLED'}.")
             set_tr_val = "true" if trace_enabled_this_session else "false"
             print("Saving trace logging preference...")
-            _, set_trace_stderr, set_trace_rc = execute_kit_core_command(
-                ["set_setting", "--key", "trace_logging_enabled", "--value", set_tr_val]
-            )
-            if set_trace_rc != 0:
-                if set_trace_rc != KITCORE_EXEC_ERROR_RETURN_CODE:
-                     print(f"Warning: Could not save trace_logging_enabled setting ('{set_tr_val}') to KITCore: {set_trace_stderr.strip()}", file=sys.stderr)
+            if _cached_set_setting("trace_logging_enabled", set_tr_val):
+                print(f"Trace logging preference ('{set_tr_val}') saved.")
             else:
-                print(f"Trace logging preference ('{set_tr_val}') saved to KITCore.")
+                print(f"Warning: Could not save trace_logging_enabled setting ('{set_tr_val}').", file=sys.stderr)
         except KeyboardInterrupt:
             print("\\nSetup for trace logging interrupted. Exiting KIT Agent.")
             sys.exit(0)
@@ -362,28 +670,22 @@ def main():
             print("\\nEOF reached during setup. Using default trace setting. Exiting KIT Agent.")
             sys.exit(1)
     
-    agent_logger, trace_logger = setup_kit_loggers(run_timestamp_str, trace_enabled_this_session)
+    from logger_utils import setup_kit_loggers, stop_kit_loggers
+    setup_kit_loggers(run_timestamp_str, trace_enabled_this_session)
     agent_logger.info("Logging system initialized.")
 
-    # Perform automatic daily purge check at startup
-    run_automatic_daily_purge()
-
-    user_name = get_current_user_name()
+    user_name = get_current_user_name(startup_settings)
     if user_name is None:
         try:
             agent_logger.info("User name not found in settings. Prompting user.")
             new_name_input = input("It looks like I don't have your name. What should I call you? (Leave blank to skip): ").strip()
             if new_name_input:
-                agent_logger.info(f"Attempting to save user name: '{new_name_input}'")
-                _, stderr_name_save, rc_name_save = execute_kit_core_command(["set_setting", "--key", "user_name", "--value", new_name_input])
-                if rc_name_save == 0:
+                agent_logger.info("Attempting to save user name: '%s'", new_name_input)
+                if _cached_set_setting("user_name", new_name_input):
                     user_name = new_name_input
-                    agent_logger.info(f"User name '{user_name}' saved successfully.")
+                    agent_logger.info("User name '%s' saved successfully.", user_name)
                 else:
-                    if rc_name_save == KITCORE_EXEC_ERROR_RETURN_CODE:
-                        agent_logger.error(f"Critical error attempting to save user name '{new_name_input}'. See previous logs. Name not saved.")
-                    else:
-                        agent_logger.error(f"Could not save user name '{new_name_input}'. KITCore error: {stderr_name_save.strip()}")
+                    agent_logger.error("Could not save user name '%s'. Name not saved.", new_name_input)
             else:
                 agent_logger.info("User chose not to provide a name for this session.")
         except KeyboardInterrupt:
@@ -392,24 +694,41 @@ def main():
         except EOFError:
             agent_logger.warning("EOF reached while prompting for user name. Continuing without name.")
 
+    # Perform automatic daily purge check at startup. It only needs the settings already read, so it runs
+    # after the name prompt: the prompt is not delayed by it, and its messages do not land in the middle of it.
+    run_automatic_daily_purge(startup_settings)
+
     welcome_msg_main = "Type 'exit' or 'quit' to stop."
     if user_name:
         welcome_msg_main = f"Welcome back, {user_name}! " + welcome_msg_main
     else: # If user_name is still None or an empty string after attempting to get/set it
         welcome_msg_main = "Welcome to KIT! " + welcome_msg_main # Generic welcome
-    agent_logger.info(f"KIT Agent activated. {welcome_msg_main}")
+    agent_logger.info("KIT Agent activated. %s", welcome_msg_main)
 
 
-    conversation_history = deque(maxlen=MAX_HISTORY_TURNS * 2) 
+    rendered_history = deque(maxlen=MAX_HISTORY_TURNS * 2) # Turns pre-rendered for the master prompt
+    qna_rendered_history = deque(maxlen=MAX_HISTORY_TURNS * 2) # Same turns, escaped for the help Q&A prompt
     # Fetch AI model preference once at the start
-    ai_model_to_use = tool_get_setting("ai_model_preference")
+    ai_model_to_use = startup_settings.get("ai_model_preference")
     if not ai_model_to_use or not isinstance(ai_model_to_use, str):
         # Fallback to the default defined in settings_tool.py if not found or invalid type
         from KITCore.tools.settings_tool import DEFAULT_SETTINGS as CORE_DEFAULT_SETTINGS
         ai_model_to_use = CORE_DEFAULT_SETTINGS.get("ai_model_preference", "gemini-1.0-pro") # Final fallback
-        agent_logger.info(f"AI model preference not set or invalid, falling back to: {ai_model_to_use}")
+        agent_logger.info("AI model preference not set or invalid, falling back to: %s", ai_model_to_use)
     else:
-        agent_logger.info(f"Using AI model preference: {ai_model_to_use}")
+        agent_logger.info("Using AI model preference: %s", ai_model_to_use)
+
+    from gemini_client import get_gemini_response, close_shared_event_loop, GeminiClientError
+    from response_cache import GeminiResponseCache, is_cacheable_response
+
+    # Help-style answers are reused for repeated/paraphrased queries instead of calling Gemini again.
+    response_cache = GeminiResponseCache(logger=agent_logger)
+    qna_answer_cache = GeminiResponseCache(logger=agent_logger)
+    # State the response handlers need across turns (see dispatch_gemini_response)
+    session = {"ai_model": ai_model_to_use, "qna_rendered_history": qna_rendered_history, "qna_answer_cache": qna_answer_cache}
+
+    # Built once: the user name is fixed for the session, so only the suffix changes per turn.
+    static_master_prefix = get_static_master_prefix(user_name)
 
     while True:
         try:
@@ -421,236 +740,78 @@ def main():
             if not query:
                 continue
 
-            conversation_history.append({"role": "user", "content": query})
-            agent_logger.info(f"User query: {query}")
-            
-            current_date_iso = datetime.now().isoformat()
-            current_gemini_prompt_base = get_gemini_master_prompt(user_name, conversation_history)
-            processed_gemini_prompt = current_gemini_prompt_base.replace("{{{{current_date_iso_for_gemini_do_not_modify}}}}", current_date_iso)
+            append_history_turn(rendered_history, qna_rendered_history, "user", query)
+            agent_logger.info("User query: %s", query)
             
-            final_prompt_for_gemini = processed_gemini_prompt + query
-            if trace_logger:
-                trace_logger.debug(f"Full prompt to Gemini:\n{final_prompt_for_gemini}")
-
-            gemini_response_text, gemini_error_message = get_gemini_response(final_prompt_for_gemini, model_name=ai_model_to_use)
-            if trace_logger:
-                trace_logger.debug(f"Gemini raw response text: {gemini_response_text}")
+            final_prompt_for_gemini = static_master_prefix + render_dynamic_suffix(rendered_history, _get_today_iso(), query)
+            if trace_logger.isEnabledFor(logging.DEBUG):
+                trace_logger.debug("Full prompt to Gemini:\n%s", final_prompt_for_gemini)
+
+            history_context = prior_turns_context(rendered_history)
+            cached_response_text = response_cache.get(query, history_context)
+            if cached_response_text is not None:
+                agent_logger.info("Using cached Gemini response for query.")
+                gemini_response_text, gemini_error_message = cached_response_text, None
+            else:
+                gemini_response_text, gemini_error_message = get_gemini_response(final_prompt_for_gemini, model_name=ai_model_to_use, logger=agent_logger)
+            if trace_logger.isEnabledFor(logging.DEBUG):
+                trace_logger.debug("Gemini raw response text: %s", gemini_response_text)
                 if gemini_error_message:
-                    trace_logger.debug(f"Gemini error message: {gemini_error_message}")
+                    trace_logger.debug("Gemini error message: %s", gemini_error_message)
 
             if gemini_error_message:
-                agent_logger.error(f"Error from Gemini client: {gemini_error_message}")
+                agent_logger.error("Error from Gemini client: %s", gemini_error_message)
                 print(f"Sorry, I encountered an issue: {gemini_error_message}")
-                conversation_history.append({"role": "assistant", "content": f"Sorry, I encountered an issue: {gemini_error_message}"})
+                append_history_turn(rendered_history, qna_rendered_history, "assistant", f"Sorry, I encountered an issue: {gemini_error_message}")
                 continue
 
             if not gemini_response_text:
                 agent_logger.error("Received no response text from Gemini.")
                 print("Sorry, I didn't get a response. Please try again.")
-                conversation_history.append({"role": "assistant", "content": "Sorry, I didn't get a response. Please try again."})
+                append_history_turn(rendered_history, qna_rendered_history, "assistant", "Sorry, I didn't get a response. Please try again.")
                 continue
 
             final_assistant_response_for_history = ""
             
             try:
-                cleaned_response_text = gemini_response_text.strip()
-                if cleaned_response_text.startswith("```json"):
-                    cleaned_response_text = cleaned_response_text[7:]
-                if cleaned_response_text.endswith("```"):
-                    cleaned_response_text = cleaned_response_text[:-3]
+                cleaned_response_text = _strip_markdown_fence(gemini_response_text)
                 
-                gemini_response_json = json.loads(cleaned_response_text)
-                if trace_logger:
-                    trace_logger.debug(f"Parsed Gemini JSON: {json.dumps(gemini_response_json)}")
-
-                output_tone = gemini_response_json.get("output_tone", "concise")
-                intent = gemini_response_json.get("intent")
-
-                if intent == "SHOW_HELP":
-                    agent_logger.info("Gemini returned SHOW_HELP intent.")
-                    help_message = get_kit_static_help_message()
-                    print(help_message)
-                    final_assistant_response_for_history = help_message
-                elif intent == "ANSWER_FROM_HELP_CONTENT_REQUEST":
-                    agent_logger.info("Gemini returned ANSWER_FROM_HELP_CONTENT_REQUEST intent.")
-                    original_user_question = gemini_response_json.get("response_text")
-                    if not original_user_question:
-                        agent_logger.error("ANSWER_FROM_HELP_CONTENT_REQUEST intent received, but no original_user_question (response_text) was found in Gemini's JSON.")
-                        fallback_message = "I was going to look up the answer to your question in the help content, but I seem to have lost the original question. Please try again."
-                        print(fallback_message)
-                        final_assistant_response_for_history = fallback_message
-                    else:
-                        agent_logger.info(f"Original question for help Q&A: {original_user_question}")
-                        full_help_text = get_kit_static_help_message()
-
-                        # Construct history block for Q&A prompt
-                        qna_history_block = ""
-                        if conversation_history:
-                            history_items = []
-                            # conversation_history already includes the current user query that triggered this Q&A
-                            for turn in conversation_history:
-                                role = "User" if turn["role"] == "user" else "Assistant"
-                                # Escape for f-string using ''' delimiters, ensuring backslashes are literal and ''' is escaped.
-                                escaped_content = str(turn['content']).replace('\\', '\\\\').replace("'''", "\'\'\'")
-                                history_items.append(f"{role}: {escaped_content}")
-                            if history_items:
-                                qna_history_block = "CONVERSATION HISTORY:\n" + "\n".join(history_items) + "\n\n"
-                        
-                        secondary_qna_prompt = f'''{qna_history_block}You are an assistant tasked with answering the user\'s latest question from the CONVERSATION HISTORY.
-Base your answer *only* on the provided KIT system help documentation and the CONVERSATION HISTORY.
-Your primary goal is to help the user understand how to interact with the KIT agent using natural language or by providing command examples if appropriate.
+                gemini_response_json = _json_loads(cleaned_response_text)
+                if trace_logger.isEnabledFor(logging.DEBUG):
+                    trace_logger.debug("Parsed Gemini JSON: %s", _json_dumps(gemini_response_json))
 
---- KIT HELP DOCUMENTATION START ---
-{full_help_text}
---- KIT HELP DOCUMENTATION END ---
-
-The user's question to answer is the last user message in the CONVERSATION HISTORY above.
-Analyze the USER'S QUESTION (from history) and the KIT HELP DOCUMENTATION carefully.
-
-Your response should EITHER be a natural language explanation OR a direct command example, based on the following STRICT criteria:
-
-1.  **CRITERIA FOR PROVIDING A DIRECT COMMAND EXAMPLE:**
-    *   Only provide a direct command example if the USER'S QUESTION (from history) uses phrases like: "show me the command for...", "what is the exact command to...", "give me the syntax for...", "command example for...", or explicitly asks for a "terminal command", "CLI syntax", or similar. Consider the context from the history.
-    *   If these specific phrases are present, AND the context from history makes it clear WHICH command they are referring to, provide the relevant command example(s) from the documentation. Frame it as giving an example of the command. If the command is ambiguous even with history, ask for clarification.
-
-2.  **CRITERIA FOR PROVIDING NATURAL LANGUAGE GUIDANCE (Default Behavior):**
-    *   For ALL OTHER questions about how to perform a task (e.g., "How do I filter notes?", "What's the way to add a tag?", "How can I find notes by tag?"), you MUST explain how the user can ask the KIT agent (you) to perform the action in natural language.
-    *   DO NOT just output the raw CLI command in these cases unless criteria 1 is met.
-    *   Instead, use the information in the documentation to formulate a sentence describing the natural language query. For example, if the documentation for finding notes by tag is `find --tags "<tag1>,<tag2>"`, and the user asks "How can I find notes by tag?", you should respond with something like: "You can ask me to find notes by specific tags. For instance, say: 'Find notes tagged project_alpha and urgent'."
+                if cached_response_text is None and is_cacheable_response(gemini_response_json):
+                    response_cache.put(query, gemini_response_text, history_context)
 
-- Frame your answer as if you are the KIT agent itself.
-- Base your answer *only* on the provided KIT HELP DOCUMENTATION and CONVERSATION HISTORY.
-- If the answer cannot be found in the documentation, or if the command is still ambiguous, state that clearly.
-'''
-                        if trace_logger:
-                            trace_logger.debug(f"Secondary Q&A prompt to Gemini:\n{secondary_qna_prompt}")
-                        
-                        qna_answer_text, qna_error_message = get_gemini_response(secondary_qna_prompt, model_name=ai_model_to_use)
-                        
-                        if trace_logger:
-                            trace_logger.debug(f"Gemini Q&A raw response text: {qna_answer_text}")
-                            if qna_error_message:
-                                trace_logger.debug(f"Gemini Q&A error message: {qna_error_message}")
-
-                        if qna_error_message:
-                            agent_logger.error(f"Error from Gemini client during Q&A call: {qna_error_message}")
-                            error_message_to_user = f"Sorry, I encountered an issue while trying to answer your question using the help content: {qna_error_message}"
-                            print(error_message_to_user)
-                            final_assistant_response_for_history = error_message_to_user
-                        elif not qna_answer_text:
-                            agent_logger.error("Received no response text from Gemini for Q&A call.")
-                            no_answer_message = "Sorry, I tried to look that up in the help content but didn't get an answer back. Please try rephrasing or ask a different question."
-                            print(no_answer_message)
-                            final_assistant_response_for_history = no_answer_message
-                        else:
-                            # Attempt to clean up if Gemini wraps its Q&A response in markdown
-                            cleaned_qna_answer = qna_answer_text.strip()
-                            if cleaned_qna_answer.startswith("```") and cleaned_qna_answer.endswith("```"):
-                                lines = cleaned_qna_answer.split('\n')
-                                if len(lines) > 1:
-                                    # Remove potential json/text specifier like ```json or ```text
-                                    cleaned_qna_answer = '\n'.join(lines[1:-1]) if lines[0].startswith("```") else '\n'.join(lines)
-                                else: # Only ``` ``` on one line with content in between
-                                     cleaned_qna_answer = cleaned_qna_answer[3:-3].strip()
-                            elif cleaned_qna_answer.startswith("```"):
-                                lines = cleaned_qna_answer.split('\n')
-                                if len(lines) > 1: 
-                                    cleaned_qna_answer = '\n'.join(lines[1:]) if lines[0].startswith("```") else '\n'.join(lines)
-                                else:
-                                    cleaned_qna_answer = cleaned_qna_answer[3:].strip()
-
-                            agent_logger.info(f"Gemini Q&A answer: {cleaned_qna_answer}")
-                            print(cleaned_qna_answer)
-                            final_assistant_response_for_history = cleaned_qna_answer
-
-                elif "actions_list" in gemini_response_json and gemini_response_json["actions_list"]:
-                    agent_logger.info(f"Gemini returned multiple actions: {len(gemini_response_json['actions_list'])} actions.")
-                    all_actions_successful = True
-                    aggregated_responses = []
-                    for i, action_item in enumerate(gemini_response_json["actions_list"]):
-                        action_intent = action_item.get("intent")
-                        kit_core_cmd_name = action_item.get("kit_core_command")
-                        parameters = action_item.get("parameters", {})
-                        agent_logger.info(f"Executing action {i+1}/{len(gemini_response_json['actions_list'])}: intent='{action_intent}', command='{kit_core_cmd_name}', params={parameters}")
-                        if kit_core_cmd_name:
-                            command_to_run_args = [kit_core_cmd_name]
-                            for param, value in parameters.items():
-                                command_to_run_args.extend([f"--{param}", str(value)])
-                            if trace_logger: trace_logger.debug(f"Executing KITCore command (action {i+1}): {command_to_run_args}")
-                            response_stdout, response_stderr, returncode = execute_kit_core_command(command_to_run_args)
-                            if trace_logger:
-                                trace_logger.debug(f"KITCore stdout (action {i+1}): {response_stdout.strip()}")
-                                trace_logger.debug(f"KITCore stderr (action {i+1}): {response_stderr.strip()}")
-                                trace_logger.debug(f"KITCore returncode (action {i+1}): {returncode}")
-                            formatted_response = format_kit_response(response_stdout, response_stderr, returncode, output_tone)
-                            print(formatted_response)
-                            aggregated_responses.append(formatted_response)
-                            if returncode != 0:
-                                agent_logger.error(f"Action {i+1} ('{kit_core_cmd_name}') failed. Stopping sequence.")
-                                all_actions_successful = False
-                                break
-                        else:
-                            agent_logger.warning(f"Action {i+1} in actions_list has no kit_core_command. Intent: {action_intent}")
-                            response_text = action_item.get("response_text", "I found an action I couldn't process.")
-                            print(response_text)
-                            aggregated_responses.append(response_text)
-                    final_assistant_response_for_history = "\\n".join(aggregated_responses)
-                    if not all_actions_successful: agent_logger.info("One or more actions in the sequence failed.")
-                    else: agent_logger.info("All actions in sequence executed successfully.")
-                elif gemini_response_json.get("kit_core_command"):
-                    kit_core_cmd_name = gemini_response_json["kit_core_command"]
-                    parameters = gemini_response_json.get("parameters", {})
-                    agent_logger.info(f"Gemini returned single action: intent='{intent}', command='{kit_core_cmd_name}', params={parameters}")
-                    command_to_run_args = [kit_core_cmd_name]
-                    for param, value in parameters.items():
-                        command_to_run_args.extend([f"--{param}", str(value)])
-                    if trace_logger: trace_logger.debug(f"Executing KITCore command: {command_to_run_args}")
-                    response_stdout, response_stderr, returncode = execute_kit_core_command(command_to_run_args)
-                    if trace_logger:
-                        trace_logger.debug(f"KITCore stdout: {response_stdout.strip()}")
-                        trace_logger.debug(f"KITCore stderr: {response_stderr.strip()}")
-                        trace_logger.debug(f"KITCore returncode: {returncode}")
-                    formatted_response = format_kit_response(response_stdout, response_stderr, returncode, output_tone)
-                    print(formatted_response)
-                    final_assistant_response_for_history = formatted_response
-                    if returncode == 0: agent_logger.info(f"KITCore command '{kit_core_cmd_name}' executed successfully.")
-                    else: agent_logger.warning(f"KITCore command '{kit_core_cmd_name}' finished with return code {returncode}.")
-                elif gemini_response_json.get("response_text"):
-                    response_text = gemini_response_json["response_text"]
-                    agent_logger.info(f"Gemini returned conversational response: intent='{intent}'")
-                    if trace_logger: trace_logger.debug(f"Response text from Gemini: {response_text}")
-                    print(response_text)
-                    final_assistant_response_for_history = response_text
-                else:
-                    agent_logger.warning("Gemini response JSON did not match expected structures (no SHOW_HELP, actions_list, kit_core_command, or response_text).")
-                    fallback_message = "I'm not sure how to proceed with that response. Please try rephrasing."
-                    print(fallback_message)
-                    final_assistant_response_for_history = fallback_message
+                final_assistant_response_for_history = dispatch_gemini_response(gemini_response_json, session)
             except json.JSONDecodeError as e:
-                agent_logger.error(f"Failed to parse Gemini's response as JSON: {e}")
-                agent_logger.error(f"Raw Gemini response was: {gemini_response_text}")
+                agent_logger.error("Failed to parse Gemini's response as JSON: %s", e)
+                agent_logger.error("Raw Gemini response was: %s", gemini_response_text)
                 fallback_message = "Sorry, I had trouble understanding the response format. Could you try again?"
                 print(fallback_message)
                 final_assistant_response_for_history = fallback_message
             except Exception as e:
-                agent_logger.error(f"An unexpected error occurred processing Gemini response or KITCore command: {e}", exc_info=True)
+                agent_logger.error("An unexpected error occurred processing Gemini response or KITCore command: %s", e, exc_info=True)
                 fallback_message = "An unexpected error occurred. Please check the logs."
                 print(fallback_message)
                 final_assistant_response_for_history = fallback_message
             
             if final_assistant_response_for_history:
-                conversation_history.append({"role": "assistant", "content": final_assistant_response_for_history})
-                if trace_logger:
-                    trace_logger.debug(f"Assistant response added to history: {final_assistant_response_for_history}")
+                append_history_turn(rendered_history, qna_rendered_history, "assistant", final_assistant_response_for_history)
+                if trace_logger.isEnabledFor(logging.DEBUG):
+                    trace_logger.debug("Assistant response added to history: %s", final_assistant_response_for_history)
 
         except KeyboardInterrupt:
             agent_logger.info("User initiated exit (Ctrl+C).")
             print("\\nExiting KIT Agent...")
             break
         except Exception as e:
-            agent_logger.critical(f"Critical unexpected error in main loop: {e}", exc_info=True)
+            agent_logger.critical("Critical unexpected error in main loop: %s", e, exc_info=True)
             print(f"A critical error occurred: {e}. Exiting. Check logs for details.")
             break
 
+    close_shared_event_loop()
+    stop_kit_loggers()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,5 @@
 import google.generativeai as genai
+import asyncio
 import os
 import sys
 import logging
@@ -11,10 +12,20 @@ SCRIPTS_DIR = PROJECT_ROOT / "scripts"
 if str(SCRIPTS_DIR) not in sys.path:
     sys.path.append(str(SCRIPTS_DIR))
 
+try:
+    from secrets_manager import SecretsManager
+except ImportError:
+    SecretsManager = None
+
+# genai.configure() is process-wide; remember which key it was last given so it is only re-run on change.
+_configured_api_key: Optional[str] = None
+
 def get_api_key_from_secrets(password: Optional[str] = None) -> Optional[str]:
     """Load Gemini API key from secrets manager (no password required for local app)"""
+    if SecretsManager is None:
+        # Secrets manager not available
+        return None
     try:
-        from secrets_manager import SecretsManager
         manager = SecretsManager()
         
         if not manager.secrets_file.exists():
@@ -23,9 +34,6 @@ def get_api_key_from_secrets(password: Optional[str] = None) -> Optional[str]:
         # Load from secrets manager (no password required)
         return manager.get_secret('GEMINI_API_KEY')
             
-    except ImportError:
-        # Secrets manager not available
-        return None
     except Exception:
         # Failed to load secrets
         return None
@@ -36,8 +44,12 @@ class GeminiClient:
         self.model_name = model_name # Store model_name
         self.system_instruction = system_instruction # Store system_instruction
         
-        # API key is no longer fetched or configured in __init__
-        # It will be fetched and configured in send_prompt_async
+        # A key passed in is always used as is. Otherwise the key is fetched from the secrets manager on the
+        # first send_prompt_async call and reused; it is dropped again if a call fails so an updated secret
+        # is picked up on retry.
+        self._explicit_api_key = api_key
+        self._api_key = api_key
+        self._api_key_lock = asyncio.Lock()
 
         model_args = {}
         if self.system_instruction:
@@ -46,12 +58,12 @@ class GeminiClient:
 
         # Initialize the model; API key will be configured per call in send_prompt_async
         self.model = genai.GenerativeModel(self.model_name, **model_args)
-        self.logger.info(f"GeminiClient initialized with model: {self.model_name}. API key will be configured on send.")
+        self.logger.info(f"GeminiClient initialized with model: {self.model_name}. API key will be configured on first send.")
 
     async def send_prompt_async(self, conversation_history: List[Dict[str, Any]]) -> str:
         """
         Sends a conversation history to the Gemini API and returns the response.
-        API key is fetched and configured here for each call.
+        The API key is fetched and configured on the first call and reused afterwards.
 
         Args:
             conversation_history: A list of message dictionaries, 
@@ -63,37 +75,100 @@ class GeminiClient:
         Raises:
             Exception if the API call fails or returns an error.
         """
+        global _configured_api_key
         try:
-            # Fetch and configure API key for this call
-            gemini_api_key = get_api_key_from_secrets()
-            if not gemini_api_key:
-                error_msg = ("Gemini API key is not configured or could not be loaded. "
-                             "Please ensure it is set correctly in the secrets manager.")
-                self.logger.error(error_msg)
-                raise ValueError(error_msg)
-            
-            # Log the key being used (from previous debugging, can be removed if too verbose later)
-            self.logger.info(f"GeminiClient attempting to use API Key: {gemini_api_key[:4]}...{gemini_api_key[-4:] if len(gemini_api_key) > 8 else ''}") # Log partial key
-            genai.configure(api_key=gemini_api_key)
-
-            self.logger.info(f"Sending conversation to Gemini model: {self.model.model_name}")
+            async with self._api_key_lock:
+                if not self._api_key:
+                    self._api_key = get_api_key_from_secrets()
+                gemini_api_key = self._api_key
+                if not gemini_api_key:
+                    error_msg = ("Gemini API key is not configured or could not be loaded. "
+                                 "Please ensure it is set correctly in the secrets manager.")
+                    self.logger.error(error_msg)
+                    raise ValueError(error_msg)
+
+                if gemini_api_key != _configured_api_key:
+                    # Log the key being used (from previous debugging, can be removed if too verbose later)
+                    if self.logger.isEnabledFor(logging.INFO):
+                        self.logger.info("GeminiClient attempting to use API Key: %s...%s", gemini_api_key[:4], gemini_api_key[-4:] if len(gemini_api_key) > 8 else '') # Log partial key
+                    genai.configure(api_key=gemini_api_key)
+                    _configured_api_key = gemini_api_key
+
+            self.logger.info("Sending conversation to Gemini model: %s", self.model.model_name)
             # The conversation_history is already in the correct format for model.generate_content
             response = await self.model.generate_content_async(conversation_history) # Use async version
             
-            full_response_text = "".join(part.text for part in response.parts) if response.parts else ""
+            parts = response.parts
+            if not parts:
+                full_response_text = ""
+            elif len(parts) == 1: # Common case: skip the join entirely
+                full_response_text = parts[0].text
+            else:
+                full_response_text = "".join([part.text for part in parts])
 
             if not full_response_text and response.prompt_feedback:
-                self.logger.error(f"Gemini API call failed due to prompt feedback: {response.prompt_feedback}")
+                self.logger.error("Gemini API call failed due to prompt feedback: %s", response.prompt_feedback)
                 raise Exception(f"Gemini API call failed due to prompt feedback: {response.prompt_feedback}")
             
             self.logger.info("Successfully received response from Gemini.")
             return full_response_text
 
         except Exception as e:
-            self.logger.error(f"An error occurred while calling the Gemini API: {e}", exc_info=True)
+            self._api_key = self._explicit_api_key # Re-read a secrets-manager key on the next call in case it was changed or revoked
+            self.logger.error("An error occurred while calling the Gemini API: %s", e, exc_info=True)
             # Re-raise the exception to be handled by the caller in ai_service
             raise Exception(f"An error occurred while calling the Gemini API: {e}")
 
+class GeminiClientError(Exception):
+    """Gemini client failure. get_gemini_response() reports these as an error message rather than raising."""
+    pass
+
+# Synchronous callers (the KIT agent's REPL) share one event loop and one GeminiClient per model, so the
+# SDK's underlying channel and its connections are reused between turns. asyncio.run() per call would
+# create and tear down a loop (and every connection bound to it) on each request.
+_shared_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_clients: Dict[Tuple[str, Optional[str]], GeminiClient] = {}
+
+def _get_shared_event_loop() -> asyncio.AbstractEventLoop:
+    global _shared_event_loop
+    if _shared_event_loop is None or _shared_event_loop.is_closed():
+        _shared_event_loop = asyncio.new_event_loop()
+    return _shared_event_loop
+
+def get_shared_client(model_name: str, system_instruction: Optional[str] = None, logger: Optional[logging.Logger] = None) -> GeminiClient:
+    """Returns the process-wide GeminiClient for this model/system instruction, creating it on first use."""
+    client_key = (model_name, system_instruction)
+    client = _shared_clients.get(client_key)
+    if client is None:
+        client = GeminiClient(model_name=model_name, logger=logger, system_instruction=system_instruction)
+        _shared_clients[client_key] = client
+    return client
+
+def get_gemini_response(prompt: str, model_name: str = "gemini-1.5-pro-latest", system_instruction: Optional[str] = None,
+                        logger: Optional[logging.Logger] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Synchronously sends a single-turn prompt to Gemini on the shared event loop.
+
+    Returns:
+        A (response_text, error_message) tuple; exactly one of the two is None.
+    """
+    try:
+        client = get_shared_client(model_name, system_instruction, logger)
+        conversation = [{"role": "user", "parts": [{"text": prompt}]}]
+        response_text = _get_shared_event_loop().run_until_complete(client.send_prompt_async(conversation))
+        return response_text, None
+    except Exception as e:
+        return None, str(e)
+
+def close_shared_event_loop():
+    """Closes the shared event loop and forgets the shared clients. Safe to call more than once."""
+    global _shared_event_loop
+    _shared_clients.clear()
+    if _shared_event_loop is not None and not _shared_event_loop.is_closed():
+        _shared_event_loop.run_until_complete(_shared_event_loop.shutdown_asyncgens())
+        _shared_event_loop.close()
+    _shared_event_loop = None
+
 if __name__ == '__main__':
     # Example usage (updated for the class):
     print("Testing Gemini Client Class...")
@@ -1,7 +1,11 @@
 import logging
+import logging.handlers
+import atexit
+import queue
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import glob
 from typing import Optional
 import sys
 
@@ -37,18 +41,207 @@ LOG_LEVEL_MAP = {
     "CRITICAL": logging.CRITICAL
 }
 
+class _CachedTimeFormatter(logging.Formatter):
+    """Formatter that runs strftime once per second of log time and reuses it for records in the same second."""
+    default_msec_format = '%s,%03d'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (second, formatted time) swapped as one tuple, since listener threads may share a formatter
+        self._cached_time = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        cached_second, time_str = self._cached_time
+        if second != cached_second:
+            time_str = time.strftime(self.default_time_format, self.converter(record.created))
+            self._cached_time = (second, time_str)
+        return self.default_msec_format % (time_str, record.msecs)
+
+# Formatters are stateless apart from the timestamp cache, so one instance of each is shared by every setup.
+_AGENT_FMT = _CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_TRACE_FMT = _CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s')
+
+# Background listeners draining each logger's queue, keyed by logger name.
+_queue_listeners = {}
+
+# File records are buffered and written in bursts of this many (or immediately for ERROR and above).
+LOG_FILE_BUFFER_CAPACITY = 512
+LOG_FILE_IO_BUFFER_BYTES = 64 * 1024
+# A session log rolls over to "<name>.log.1" once it reaches MAX_LOG_SIZE_MB; older rollovers are dropped.
+LOG_FILE_MAX_BYTES = MAX_LOG_SIZE_MB * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 1
+
+class BufferedFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Size-capped log file with a large I/O buffer that does not flush after every record; flush()/close() write it out.
+    Unlike RotatingFileHandler, mode='w' is kept when maxBytes is set, so a session file starts empty.
+    """
+    def __init__(self, filename, mode='a', maxBytes=0, backupCount=0, encoding=None, delay=False, errors=None):
+        super().__init__(filename, mode='a', maxBytes=maxBytes, backupCount=backupCount,
+                         encoding=encoding, delay=True, errors=errors)
+        self.mode = mode
+        self.delay = delay
+        self._stream_size = 0
+        if not delay:
+            self.stream = self._open()
+
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=LOG_FILE_IO_BUFFER_BYTES, encoding=self.encoding or "utf-8", errors=self.errors)
+        self._stream_size = stream.seek(0, os.SEEK_END) if self.mode == 'a' else 0
+        return stream
+
+    def _write(self, text: str):
+        # Characters stand in for bytes: tell() on a text stream would flush the buffer on every call.
+        self.stream.write(text)
+        self._stream_size += len(text)
+        if self.maxBytes > 0 and self._stream_size >= self.maxBytes:
+            self.doRollover()
+
+    def emit(self, record):
+        if self.stream is None:
+            if self.mode != 'w' or not self._closed:
+                self.stream = self._open()
+        if self.stream is None:
+            return
+        try:
+            self._write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def emit_batch(self, records):
+        """Formats a batch of records and hands them to the stream as a single write."""
+        if not records:
+            return
+        with self.lock:
+            if self.stream is None:
+                if self.mode != 'w' or not self._closed:
+                    self.stream = self._open()
+            if self.stream is None:
+                return
+            try:
+                terminator = self.terminator
+                self._write("".join([self.format(record) + terminator for record in records]))
+            except RecursionError:
+                raise
+            except Exception:
+                self.handleError(records[-1])
+
+class _BatchedMemoryHandler(logging.handlers.MemoryHandler):
+    """
+    MemoryHandler that passes its whole buffer to a BufferedFileHandler in one write and then
+    flushes the file once, so a batch of records costs a single write() syscall.
+    """
+    def flush(self):
+        with self.lock:
+            if self.target and self.buffer:
+                if isinstance(self.target, BufferedFileHandler) and not self.target.filters:
+                    self.target.emit_batch(self.buffer)
+                else:
+                    for record in self.buffer:
+                        self.target.handle(record)
+                self.buffer.clear()
+            if self.target:
+                self.target.flush()
+
+def _buffered_file_handler(file_handler: logging.FileHandler) -> logging.handlers.MemoryHandler:
+    """Wraps a FileHandler so records are written in batches instead of one write() per record."""
+    return _BatchedMemoryHandler(LOG_FILE_BUFFER_CAPACITY, flushLevel=logging.ERROR,
+                                 target=file_handler, flushOnClose=True)
+
+def _stop_queue_listener(listener: logging.handlers.QueueListener):
+    """Stops the listener, then flushes and closes its handlers (including buffered file targets)."""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+        if isinstance(handler, logging.handlers.MemoryHandler) and handler.target:
+            handler.target.close()
+
+def _attach_queue_listener(logger: logging.Logger, *handlers: logging.Handler):
+    """Routes the logger through a QueueHandler so file/console writes happen on a listener thread."""
+    previous_listener = _queue_listeners.pop(logger.name, None)
+    if previous_listener:
+        _stop_queue_listener(previous_listener)
+
+    log_queue = queue.Queue(-1)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _queue_listeners[logger.name] = listener
+    return listener
+
+@atexit.register
+def stop_kit_loggers():
+    """
+    Stops the queue listeners, flushing any records still queued to their files/console.
+    Runs automatically at interpreter exit; callers with an explicit shutdown path may call it earlier.
+    """
+    for listener in _queue_listeners.values():
+        _stop_queue_listener(listener)
+    _queue_listeners.clear()
+
+# Parallel unlinks for log rotation; a single file is removed inline rather than paying for a thread pool.
+LOG_CLEANUP_MAX_WORKERS = 4
+
+def _remove_old_log_file(log_path: str):
+    try:
+        os.remove(log_path)
+        print(f"LOG UTIL: Removed old agent log file: {log_path}", file=sys.stderr) 
+    except OSError as e:
+        print(f"LOG UTIL ERROR: Error removing old agent log file {log_path}: {e}", file=sys.stderr)
+    for backup_index in range(1, LOG_FILE_BACKUP_COUNT + 1): # Size rollovers of that session, if any
+        try:
+            os.remove(f"{log_path}.{backup_index}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"LOG UTIL ERROR: Error removing old agent log file {log_path}.{backup_index}: {e}", file=sys.stderr)
+
+def _build_logger(name: str, level: int, log_file: str, formatter: logging.Formatter, add_console: bool) -> logging.Logger:
+    """Resets the named logger and routes it through a queue listener to a buffered session file (and optionally the console)."""
+    logger = logging.getLogger(name)
+    logger.disabled = False
+    logger.setLevel(level)
+    # Clear existing handlers to prevent duplicate logging if re-initialized
+    if logger.hasHandlers():
+        logger.handlers.clear()
+
+    file_handler = BufferedFileHandler(log_file, mode='w', maxBytes=LOG_FILE_MAX_BYTES,
+                                       backupCount=LOG_FILE_BACKUP_COUNT, delay=True)
+    file_handler.setFormatter(formatter)
+    handlers = [_buffered_file_handler(file_handler)]
+    if add_console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.setLevel(level)
+        handlers.append(console_handler)
+    _attach_queue_listener(logger, *handlers)
+    return logger
+
 def setup_kit_loggers(run_timestamp_str: str, trace_enabled_for_session: bool, max_log_files: Optional[int] = None):
-    """Configures and returns the kit_agent_logger and kit_trace_logger."""
+    """
+    Configures the shared "KIT_Agent" and "KIT_Trace" loggers and returns them.
+    Modules holding logging.getLogger() references to these names pick up the handlers directly.
+    When tracing is disabled for the session, "KIT_Trace" is returned disabled: calls on it are no-ops
+    and isEnabledFor() is False, so callers never need to check for None.
+    """
     logs_dir = os.path.join(os.path.dirname(__file__), "..", "logs") # logs relative to backend/
     os.makedirs(logs_dir, exist_ok=True)
 
     # --- Log rotation/cleanup for kit_agent logs ---
     if max_log_files is not None and max_log_files > 0: # Ensure max_log_files is a positive number
-        agent_log_pattern = os.path.join(logs_dir, "kit_agent_*.log")
-        existing_agent_logs = sorted(
-            glob.glob(agent_log_pattern),
-            key=os.path.getmtime # Oldest first
-        )
+        # One scandir pass; each DirEntry caches its stat result, so every file is stat'ed once
+        with os.scandir(logs_dir) as dir_entries:
+            agent_log_entries = [
+                (entry.stat().st_mtime, entry.path) for entry in dir_entries
+                if entry.name.startswith("kit_agent_") and entry.name.endswith(".log") and entry.is_file()
+            ]
+        agent_log_entries.sort() # Oldest first
+        existing_agent_logs = [path for _, path in agent_log_entries]
 
         # Calculate how many files to delete
         # We want to make space if the current number of logs plus the new one will exceed the max
@@ -62,53 +255,37 @@ def setup_kit_loggers(run_timestamp_str: str, trace_enabled_for_session: bool, m
             # Ensure we don't try to delete more files than exist
             files_to_delete_count = min(files_to_delete_count, num_existing)
 
-            for i in range(files_to_delete_count):
-                try:
-                    os.remove(existing_agent_logs[i]) # Remove the oldest ones
-                    print(f"LOG UTIL: Removed old agent log file: {existing_agent_logs[i]}", file=sys.stderr) 
-                except OSError as e:
-                    print(f"LOG UTIL ERROR: Error removing old agent log file {existing_agent_logs[i]}: {e}", file=sys.stderr)
+            logs_to_delete = existing_agent_logs[:files_to_delete_count] # Remove the oldest ones
+            if len(logs_to_delete) == 1:
+                _remove_old_log_file(logs_to_delete[0])
+            elif logs_to_delete:
+                # unlink() releases the GIL, so removals overlap instead of queueing behind each other
+                with ThreadPoolExecutor(max_workers=min(LOG_CLEANUP_MAX_WORKERS, len(logs_to_delete))) as executor:
+                    list(executor.map(_remove_old_log_file, logs_to_delete))
 
     # --- Kit Agent Logger (Normal) ---
-    agent_logger = logging.getLogger("KIT_Agent")
     agent_log_level_str = DEFAULT_LOG_LEVEL.upper()
     agent_log_level = LOG_LEVEL_MAP.get(agent_log_level_str, logging.INFO)
-    agent_logger.setLevel(agent_log_level)
-
-    # Clear existing handlers for KIT_Agent to prevent duplicate logging if re-initialized
-    if agent_logger.hasHandlers():
-        agent_logger.handlers.clear()
-
     agent_log_file = os.path.join(logs_dir, f"kit_agent_{run_timestamp_str}.log")
-    agent_handler = logging.FileHandler(agent_log_file, mode='w')
-    agent_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    agent_handler.setFormatter(agent_formatter)
-    agent_logger.addHandler(agent_handler)
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(agent_formatter)
-    console_handler.setLevel(agent_log_level)
-    agent_logger.addHandler(console_handler)
-
-    agent_logger.info(f"Agent logger initialized. Level: {agent_log_level_str}. File: {agent_log_file}")
+    agent_logger = _build_logger("KIT_Agent", agent_log_level, agent_log_file, _AGENT_FMT, add_console=True)
+    agent_logger.info("Agent logger initialized. Level: %s. File: %s", agent_log_level_str, agent_log_file)
 
     # --- Kit Trace Logger (Detailed) ---
-    trace_logger = None
     if trace_enabled_for_session:
-        trace_logger = logging.getLogger("KIT_Trace")
-        trace_logger.setLevel(logging.DEBUG)
-
-        if trace_logger.hasHandlers():
-            trace_logger.handlers.clear()
-            
         trace_log_file = os.path.join(logs_dir, f"kit_trace_{run_timestamp_str}.log")
-        trace_handler = logging.FileHandler(trace_log_file, mode='w')
-        trace_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(module)s:%(funcName)s:%(lineno)d - %(message)s')
-        trace_handler.setFormatter(trace_formatter)
-        trace_logger.addHandler(trace_handler)
-        trace_logger.info(f"Trace logger initialized. Level: DEBUG. File: {trace_log_file}")
+        trace_logger = _build_logger("KIT_Trace", logging.DEBUG, trace_log_file, _TRACE_FMT, add_console=False)
+        trace_logger.info("Trace logger initialized. Level: DEBUG. File: %s", trace_log_file)
         agent_logger.info("Trace logging is ENABLED for this session.")
     else:
+        # A previous initialisation may have enabled tracing; detach it so its listener thread does not linger
+        trace_logger = logging.getLogger("KIT_Trace")
+        previous_trace_listener = _queue_listeners.pop("KIT_Trace", None)
+        if previous_trace_listener:
+            _stop_queue_listener(previous_trace_listener)
+            trace_logger.handlers.clear()
+        # Disabled rather than None: a level left at DEBUG by an earlier session would otherwise let
+        # isEnabledFor() guards pass and records propagate to the root handlers.
+        trace_logger.disabled = True
         agent_logger.info("Trace logging is DISABLED for this session.")
 
     return agent_logger, trace_logger
@@ -154,18 +331,17 @@ if __name__ == '__main__':
     agent_log.debug("This is an agent debug message (should not appear if level is INFO).")
     agent_log.info("This is an agent info message.")
     agent_log.warning("This is an agent warning message.")
-    if trace_log:
-        trace_log.debug("This is a trace debug message (should not appear as trace_log is None).")
-    else:
-        print("Trace log is None, as expected.")
+    trace_log.debug("This is a trace debug message (should not appear as trace_log is disabled).")
+    if trace_log.disabled:
+        print("Trace log is disabled, as expected.")
 
     print("\n--- Test 2: Trace Enabled, Max Logs 1 ---")
     agent_log2, trace_log2 = setup_kit_loggers(f"{ts}_test2", trace_enabled_for_session=True, max_log_files=1)
     agent_log2.info("This is another agent info message.")
-    if trace_log2:
+    if not trace_log2.disabled:
         trace_log2.debug("This is a trace debug message (should appear).")
         trace_log2.info("This is a trace info message (should appear).")
     else:
-        print("Trace log is None, which is UNEXPECTED here.")
+        print("Trace log is disabled, which is UNEXPECTED here.")
     
     print(f"\nCheck the '{temp_logs_dir}' directory for output files.") 
\ No newline at end of file
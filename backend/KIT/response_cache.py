@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# Intents whose Gemini responses do not depend on note data and never trigger KITCore commands,
+# so a repeated (or near-identical) query can safely reuse the earlier response.
+CACHEABLE_INTENTS = frozenset({"SHOW_HELP", "ANSWER_FROM_HELP_CONTENT_REQUEST"})
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_SIMILARITY_THRESHOLD = 0.87
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial rewordings share a key."""
+    return _WHITESPACE_RE.sub(" ", str(query)).strip().lower().rstrip("?!. ")
+
+def _context_digest(context: str) -> str:
+    """Short, fixed-size stand-in for the conversation context an entry was generated under."""
+    return hashlib.sha1(context.encode("utf-8")).hexdigest() if context else ""
+
+def is_cacheable_response(gemini_response_json: Dict[str, Any]) -> bool:
+    """True if the parsed Gemini response is safe to replay for a later, similar query."""
+    if gemini_response_json.get("actions_list") or gemini_response_json.get("kit_core_command"):
+        return False
+    return gemini_response_json.get("intent") in CACHEABLE_INTENTS
+
+class GeminiResponseCache:
+    """
+    LRU cache of Gemini response texts keyed by the user's query and its conversation context.
+
+    Lookups first try the normalized query text. If `sentence-transformers` and `numpy`
+    are installed, queries are also embedded and a cached entry whose cosine similarity
+    is at least `similarity_threshold` is returned, so paraphrased questions hit too.
+    Without those packages the cache falls back to exact (normalized) matching.
+
+    The prompt sent to Gemini also carries the conversation history, so a follow-up such as
+    "how do I do that?" means something different in each conversation. Callers pass that
+    history as `context`; an entry is only returned for a lookup with the same context.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 embedding_model_name: Optional[str] = DEFAULT_EMBEDDING_MODEL,
+                 logger: Optional[logging.Logger] = None):
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._embedding_model_name = embedding_model_name
+        self._embedding_model = None
+        self._embeddings_disabled = embedding_model_name is None
+        self._np = None
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict() # (context digest, key) -> (embedding or None, response_text)
+        self._last_embedding = (None, None) # (key, embedding) of the most recent lookup, reused by put()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_embedding_model(self):
+        if self._embeddings_disabled:
+            return None
+        if self._embedding_model is None:
+            try:
+                import numpy as np
+                from sentence_transformers import SentenceTransformer
+                self._embedding_model = SentenceTransformer(self._embedding_model_name)
+                self._np = np
+                self.logger.info("Semantic response cache enabled with embedding model: %s", self._embedding_model_name)
+            except ImportError:
+                self.logger.info("sentence-transformers/numpy not installed; response cache uses exact query matching.")
+                self._embeddings_disabled = True
+            except Exception as e:
+                self.logger.warning("Could not load embedding model '%s' for the response cache: %s", self._embedding_model_name, e)
+                self._embeddings_disabled = True
+        return self._embedding_model
+
+    def _embed(self, key: str):
+        if self._last_embedding[0] == key:
+            return self._last_embedding[1]
+        model = self._get_embedding_model()
+        if model is None:
+            return None
+        embedding = model.encode(key, normalize_embeddings=True)
+        self._last_embedding = (key, embedding)
+        return embedding
+
+    def get(self, query: str, context: str = "") -> Optional[str]:
+        """Returns the cached response text for `query` (or a close paraphrase of it) under `context`, or None."""
+        key = normalize_query(query)
+        if not key:
+            return None
+        context_digest = _context_digest(context)
+        entry = self._entries.get((context_digest, key))
+        if entry is not None:
+            self._entries.move_to_end((context_digest, key))
+            return entry[1]
+
+        query_embedding = self._embed(key)
+        if query_embedding is None:
+            return None
+        candidates = [(cached_key, cached_entry) for cached_key, cached_entry in self._entries.items()
+                      if cached_key[0] == context_digest and cached_entry[0] is not None]
+        if not candidates:
+            return None
+        # Embeddings are L2-normalized, so the dot product is the cosine similarity.
+        similarities = self._np.stack([cached_entry[0] for _, cached_entry in candidates]) @ query_embedding
+        best_index = int(similarities.argmax())
+        if similarities[best_index] < self.similarity_threshold:
+            return None
+        best_key, best_entry = candidates[best_index]
+        self.logger.debug("Response cache semantic hit (%.3f): '%s' ~ '%s'", float(similarities[best_index]), key, best_key[1])
+        self._entries.move_to_end(best_key)
+        return best_entry[1]
+
+    def put(self, query: str, response_text: str, context: str = ""):
+        """Stores `response_text` for `query` under `context`, evicting the least recently used entry when full."""
+        key = normalize_query(query)
+        if not key or not response_text:
+            return
+        entry_key = (_context_digest(context), key)
+        self._entries[entry_key] = (self._embed(key), response_text)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._last_embedding = (None, None)
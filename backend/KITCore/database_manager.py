@@ -2,6 +2,11 @@ import sqlite3
 import os
 import sys
 import subprocess
+import functools
+import threading
+import atexit
+import weakref
+import logging
 
 # Add the parent directory of KITCore (which is backend) to sys.path
 _current_dir = os.path.dirname(os.path.abspath(__file__)) # This is backend/KITCore
@@ -26,9 +31,9 @@ except ImportError as e:
 # The main executable script (KITCore.py or test scripts) should ensure PROJECT_ROOT is in sys.path.
 # from config import KIT_DATABASE_PATH as DEFAULT_KIT_DATABASE_PATH, KIT_DATABASE_DIR as DEFAULT_KIT_DATABASE_DIR # Old import
 
-def _get_effective_db_path_and_dir():
-    """Determines the database path and directory, prioritizing an environment variable for testing."""
-    env_db_path = os.environ.get('KIT_TEST_DB_PATH')
+@functools.lru_cache(maxsize=None)
+def _resolve_db_path_and_dir(env_db_path):
+    """Resolves (db_path, db_dir) for a given KIT_TEST_DB_PATH value; cached since the result only depends on it."""
     if env_db_path:
         # Ensure the path is absolute if a relative path is given via env var,
         # assuming it's relative to the project root for consistency if not absolute.
@@ -42,141 +47,354 @@ def _get_effective_db_path_and_dir():
         # print(f"DEBUG: Using DEFAULT database path: {DEFAULT_KIT_DATABASE_PATH}", file=sys.stderr) # For debugging
         return DEFAULT_KIT_DATABASE_PATH, DEFAULT_KIT_DATABASE_DIR
 
+def _get_effective_db_path_and_dir():
+    """Determines the database path and directory, prioritizing an environment variable for testing."""
+    return _resolve_db_path_and_dir(os.environ.get('KIT_TEST_DB_PATH'))
+
+# For test harnesses that patch the module-level defaults rather than the environment variable.
+clear_db_path_cache = _resolve_db_path_and_dir.cache_clear
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection cached per thread by get_db_connection(). Callers keep their usual
+    `conn.close()` in finally blocks: it rolls back any uncommitted transaction and leaves the
+    connection open for the next call on this thread. Foreign key enforcement changed through
+    set_foreign_keys() is reset to SQLite's default on close, as a real close would.
+    """
+    _foreign_keys_changed = False
+
+    def set_foreign_keys(self, enabled: bool):
+        """Turns foreign key enforcement on or off until close(). Has no effect inside an open transaction."""
+        self.execute("PRAGMA foreign_keys = ON;" if enabled else "PRAGMA foreign_keys = OFF;")
+        self._foreign_keys_changed = True
+
+    def close(self):
+        try:
+            if self.in_transaction:
+                self.rollback()
+            if self._foreign_keys_changed:
+                self.execute("PRAGMA foreign_keys = OFF;")
+                self._foreign_keys_changed = False
+        except sqlite3.ProgrammingError:
+            pass # Already closed for real (replaced in the pool)
+
+    def close_connection(self):
+        """Actually closes the underlying SQLite connection, first letting SQLite refresh planner statistics it considers stale."""
+        try:
+            self.execute("PRAGMA optimize;")
+        except sqlite3.Error:
+            pass # Best effort; the file may already be gone or locked
+        sqlite3.Connection.close(self)
+
+# Diagnostics go through the agent's logger; with no handlers configured, warnings and errors still reach stderr.
+_log = logging.getLogger("KIT_Agent")
+
+# Hot single-row settings statements. Keeping each as one shared string means every call hits the
+# connection's prepared statement cache instead of re-parsing the SQL.
+UPSERT_SETTING_SQL = (
+    "INSERT INTO user_settings (setting_key, setting_value) VALUES (?, ?) "
+    "ON CONFLICT(setting_key) DO UPDATE SET setting_value = excluded.setting_value"
+)
+GET_SETTING_SQL = "SELECT setting_value FROM user_settings WHERE setting_key = ?"
+# Prepared statements kept per connection (sqlite3's default is 128); pooled connections live long enough to benefit.
+CACHED_STATEMENTS = 256
+
+# One open connection per thread, plus the identity of the database file it was opened on.
+# The registry is weak so a finished thread's connection is closed when its thread-local data is released.
+_thread_local = threading.local()
+_open_connections = weakref.WeakSet()
+_open_connections_lock = threading.Lock()
+
+# Applied to every new connection. WAL lets readers proceed during writes and, with synchronous=NORMAL,
+# avoids an fsync on every commit; the rest keep temp tables and hot pages in memory.
+_CONNECTION_PRAGMAS = "PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY; PRAGMA mmap_size=268435456; PRAGMA cache_size=-20000;"
+# journal_mode=WAL is stored in the database file, so it is only set on the first connection to each file.
+_wal_enabled_db_files = set()
+# Database directories already created/verified by get_db_connection(), so os.makedirs runs once per directory.
+_ensured_dirs = set()
+
+def _discard_thread_connection():
+    conn = getattr(_thread_local, "conn", None)
+    _thread_local.conn = None
+    _thread_local.db_file_key = None
+    if conn is not None:
+        with _open_connections_lock:
+            _open_connections.discard(conn)
+        try:
+            conn.close_connection()
+        except sqlite3.Error:
+            pass
+
+@atexit.register
+def close_all_db_connections():
+    """Closes every pooled connection. Runs at interpreter exit."""
+    with _open_connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+    for conn in connections:
+        try:
+            conn.close_connection()
+        except sqlite3.Error:
+            pass
+
 def get_db_connection():
-    """Establishes and returns a SQLite database connection using the effective path."""
+    """
+    Returns this thread's SQLite connection to the effective database, opening it on first use.
+    The connection is reopened if the database path changes or the file is replaced (e.g. between tests).
+    """
+    return get_db_connection_and_path()[0]
+
+def get_db_connection_and_path():
+    """Like get_db_connection(), but returns (conn, db_path) so callers can report the path without resolving it again."""
     db_path, db_dir = _get_effective_db_path_and_dir()
     try:
-        if not os.path.exists(db_path):
+        try:
+            db_stat = os.stat(db_path)
+        except FileNotFoundError:
+            db_stat = None
             # This message is more relevant if we are *expecting* the default DB to exist.
             # For tests, the DB might be created on the fly.
             # Consider if this print is always appropriate or should be conditional.
-            print(f"Database not found at {db_path}. Attempting to create directory if needed.", file=sys.stderr)
+            _log.info("Database not found at %s. Attempting to create directory if needed.", db_path)
+
+        conn = getattr(_thread_local, "conn", None)
+        if conn is not None:
+            if db_stat is not None and _thread_local.db_file_key == (db_path, db_stat.st_dev, db_stat.st_ino):
+                return conn, db_path
+            _discard_thread_connection()
 
         # Ensure the directory exists, especially for test databases that might be in temp locations.
-        if db_dir: # db_dir could be empty if db_path is just a filename in CWD.
-             os.makedirs(db_dir, exist_ok=True)
+        # Skipped when the database file was found above or the directory was already ensured by this process.
+        if db_dir and db_stat is None and db_dir not in _ensured_dirs: # db_dir could be empty if db_path is just a filename in CWD.
+            os.makedirs(db_dir, exist_ok=True)
+            _ensured_dirs.add(db_dir)
         
-        conn = sqlite3.connect(db_path)
+        conn = sqlite3.connect(db_path, factory=PooledConnection, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
         conn.row_factory = sqlite3.Row # Access columns by name
-        return conn
+        db_stat = os.stat(db_path)
+        db_file_key = (db_path, db_stat.st_dev, db_stat.st_ino)
+        if db_file_key not in _wal_enabled_db_files:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            _wal_enabled_db_files.add(db_file_key)
+        conn.executescript(_CONNECTION_PRAGMAS)
+        _thread_local.conn = conn
+        _thread_local.db_file_key = db_file_key
+        with _open_connections_lock:
+            _open_connections.add(conn)
+        return conn, db_path
     except sqlite3.Error as e:
-        print(f"Database connection error for {db_path}: {e}", file=sys.stderr)
-        return None
+        _ensured_dirs.discard(db_dir) # The directory may have been removed since; recreate it on the next attempt.
+        _log.error("Database connection error for %s: %s", db_path, e)
+        return None, db_path
     except OSError as e:
-        print(f"OS error while ensuring database directory {db_dir} exists or connecting to {db_path}: {e}", file=sys.stderr)
-        return None
+        _log.error("OS error while ensuring database directory %s exists or connecting to %s: %s", db_dir, db_path, e)
+        return None, db_path
+
+# Full schema, run as one script by create_tables(). Existing tables are dropped first for a clean slate.
+_CREATE_TABLES_SCRIPT = """
+BEGIN;
+
+-- Drop tables in an order that respects foreign key constraints
+-- (child tables or tables referenced by others should be dropped first).
+DROP TABLE IF EXISTS note_tags;
+DROP TABLE IF EXISTS notes_fts;
+DROP TABLE IF EXISTS notes;
+DROP TABLE IF EXISTS tags;
+DROP TABLE IF EXISTS user_settings;
+
+-- Notes Table (with versioning)
+CREATE TABLE IF NOT EXISTS notes (
+    note_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_note_id INTEGER,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_latest_version BOOLEAN NOT NULL CHECK (is_latest_version IN (0, 1)),
+    properties_json TEXT,
+    is_deleted BOOLEAN DEFAULT 0 NOT NULL CHECK (is_deleted IN (0, 1)),
+    deleted_at TIMESTAMP,
+    FOREIGN KEY (original_note_id) REFERENCES notes(note_id)
+);
+
+-- Tags Table
+CREATE TABLE IF NOT EXISTS tags (
+    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag_type TEXT NOT NULL DEFAULT 'general',
+    tag_value TEXT NOT NULL
+);
+
+-- Note_Tags Junction Table
+-- WITHOUT ROWID: rows live in the (note_version_id, tag_id) primary-key B-tree instead of a rowid table plus a PK index.
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_version_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (note_version_id, tag_id),
+    FOREIGN KEY (note_version_id) REFERENCES notes(note_id),
+    FOREIGN KEY (tag_id) REFERENCES tags(tag_id)
+) WITHOUT ROWID;
+
+-- User Settings Table
+-- WITHOUT ROWID stores setting_value in the primary-key B-tree, so get_setting() is one index lookup
+-- instead of an autoindex search followed by a table-row fetch.
+CREATE TABLE IF NOT EXISTS user_settings (
+    setting_key TEXT PRIMARY KEY,
+    setting_value TEXT
+) WITHOUT ROWID;
+
+-- Indexes for notes table
+CREATE INDEX IF NOT EXISTS idx_notes_latest_deleted_created ON notes (is_latest_version, is_deleted, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notes_original_latest_deleted ON notes (original_note_id, is_latest_version, is_deleted);
+-- Indexes for tags table (this unique index is also what keeps (tag_type, tag_value) pairs unique)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tags_type_value ON tags (tag_type, tag_value);
+-- Indexes for note_tags junction table (lookups by note_version_id use the primary key)
+CREATE INDEX IF NOT EXISTS idx_note_tags_tag_id ON note_tags (tag_id);
+
+-- Seed sqlite_stat1 so the planner has statistics for the indexes above from the first query
+ANALYZE;
+
+COMMIT;
+"""
+
+# Full-text index over notes.content for find_notes() keyword search. It is an external-content FTS5 table
+# (the text is stored only in notes) kept in sync by triggers; the trigram tokenizer matches arbitrary
+# case-insensitive substrings of 3+ characters, like the LIKE '%keyword%' it replaces.
+# Separate from _CREATE_TABLES_SCRIPT because FTS5 or the trigram tokenizer (SQLite 3.34+) may be missing
+# from the SQLite build; keyword search then stays on LIKE. 'rebuild' indexes any notes already present.
+_NOTES_FTS_SCRIPT = """
+BEGIN;
+CREATE VIRTUAL TABLE notes_fts USING fts5(content, content='notes', content_rowid='note_id', tokenize='trigram');
+CREATE TRIGGER notes_fts_after_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts (rowid, content) VALUES (new.note_id, new.content);
+END;
+CREATE TRIGGER notes_fts_after_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.note_id, old.content);
+END;
+CREATE TRIGGER notes_fts_after_update AFTER UPDATE OF note_id, content ON notes BEGIN
+    INSERT INTO notes_fts (notes_fts, rowid, content) VALUES ('delete', old.note_id, old.content);
+    INSERT INTO notes_fts (rowid, content) VALUES (new.note_id, new.content);
+END;
+INSERT INTO notes_fts (notes_fts) VALUES ('rebuild');
+COMMIT;
+"""
+
+def _create_notes_fts(conn):
+    """Creates notes_fts and its triggers; returns False (leaving the schema unchanged) if this SQLite build cannot."""
+    try:
+        conn.executescript(_NOTES_FTS_SCRIPT)
+        conn.notes_fts_enabled = True
+        return True
+    except sqlite3.OperationalError as e:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.notes_fts_enabled = False
+        _log.warning("Note content search index not available (%s); keyword search will scan notes with LIKE.", e)
+        return False
+
+def notes_fts_enabled(conn):
+    """True if the connection's database has the notes_fts index. Looked up once per connection."""
+    enabled = getattr(conn, "notes_fts_enabled", None)
+    if enabled is None:
+        enabled = bool(conn.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts')").fetchone()[0])
+        conn.notes_fts_enabled = enabled
+    return enabled
 
 def create_tables():
     """Creates the necessary tables in the database. Drops existing tables first to ensure a clean slate."""
     conn = None # Initialize conn to None for the finally block
-    db_path, _ = _get_effective_db_path_and_dir() # Get current path for messages
+    db_path = None
     try:
-        conn = get_db_connection()
+        conn, db_path = get_db_connection_and_path()
         if conn is None:
-            print(f"Cannot create tables for {db_path}: database connection failed.", file=sys.stderr)
+            _log.error("Cannot create tables for %s: database connection failed.", db_path)
             return False # Indicate failure
 
-        cursor = conn.cursor()
-
-        # Enable foreign key support for this connection (important for ON DELETE CASCADE if used, and general integrity)
-        # For DROP TABLE, it's less critical but good practice to be aware of FKs.
-        cursor.execute("PRAGMA foreign_keys = ON;")
-
-        # Drop tables in an order that respects foreign key constraints
-        # (child tables or tables referenced by others should be dropped first).
-        cursor.execute("DROP TABLE IF EXISTS note_tags;")
-        cursor.execute("DROP TABLE IF EXISTS notes;")
-        cursor.execute("DROP TABLE IF EXISTS tags;")
-        cursor.execute("DROP TABLE IF EXISTS user_settings;")
-        
+        # Enable foreign key support for this connection (important for ON DELETE CASCADE if used, and general integrity).
+        # Must be set outside the transaction below to take effect.
+        conn.set_foreign_keys(True)
+        # Drops, table creation and indexes are parsed and applied in one executescript call and one transaction.
+        conn.executescript(_CREATE_TABLES_SCRIPT)
+        _create_notes_fts(conn)
         print(f"Existing tables (if any) dropped in {db_path}.", file=sys.stdout) # Added for clarity during initdb
-
-        # Notes Table (with versioning)
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS notes (
-            note_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            original_note_id INTEGER,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_latest_version BOOLEAN NOT NULL CHECK (is_latest_version IN (0, 1)),
-            properties_json TEXT,
-            is_deleted BOOLEAN DEFAULT 0 NOT NULL CHECK (is_deleted IN (0, 1)),
-            deleted_at TIMESTAMP,
-            FOREIGN KEY (original_note_id) REFERENCES notes(note_id)
-        );
-        """)
-
-        # Tags Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tags (
-            tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tag_type TEXT NOT NULL DEFAULT 'general',
-            tag_value TEXT NOT NULL,
-            UNIQUE (tag_type, tag_value)
-        );
-        """)
-
-        # Note_Tags Junction Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS note_tags (
-            note_version_id INTEGER NOT NULL,
-            tag_id INTEGER NOT NULL,
-            PRIMARY KEY (note_version_id, tag_id),
-            FOREIGN KEY (note_version_id) REFERENCES notes(note_id),
-            FOREIGN KEY (tag_id) REFERENCES tags(tag_id)
-        );
-        """)
-
-        # User Settings Table
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_settings (
-            setting_key TEXT PRIMARY KEY,
-            setting_value TEXT
-        );
-        """)
-
-        # --- Add Indexes for Performance ---
-        print(f"Creating indexes in {db_path}...", file=sys.stdout)
-        # Indexes for notes table
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_latest_deleted_created ON notes (is_latest_version, is_deleted, created_at DESC);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_original_note_id ON notes (original_note_id);")
-        # Indexes for tags table
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tags_type_value ON tags (tag_type, tag_value);")
-        # Indexes for note_tags junction table (covered by PK, but explicit can sometimes help specific queries)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_note_version_id ON note_tags (note_version_id);")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag_id ON note_tags (tag_id);")
         print(f"Indexes checked/created in {db_path}.", file=sys.stdout)
-        # --- End Indexes ---
 
         conn.commit()
         print(f"Database tables checked/created at {db_path}") # Keep this stdout for CLI success
         return True # Indicate success
     except sqlite3.Error as e:
-        print(f"Database error during table creation for {db_path}: {e}", file=sys.stderr)
+        _log.error("Database error during table creation for %s: %s", db_path, e)
         return False # Indicate failure
     except Exception as e: # Catch any other unexpected errors
-        print(f"An unexpected error occurred during table creation for {db_path}: {e}", file=sys.stderr)
+        _log.error("An unexpected error occurred during table creation for %s: %s", db_path, e)
         return False # Indicate failure
     finally:
         if conn:
             conn.close()
 
+# Index changes applied by upgrade_schema() to a database created by an older create_tables():
+# the original_note_id lookups also filter on is_latest_version/is_deleted, so the composite index answers
+# them without reading table rows, and the old note_version_id index duplicated the note_tags primary key.
+_INDEX_UPGRADE_SCRIPT = """
+BEGIN;
+DROP INDEX IF EXISTS idx_notes_original_note_id;
+DROP INDEX IF EXISTS idx_note_tags_note_version_id;
+CREATE INDEX IF NOT EXISTS idx_notes_original_latest_deleted ON notes (original_note_id, is_latest_version, is_deleted);
+ANALYZE;
+COMMIT;
+"""
+
+def upgrade_schema():
+    """
+    Brings a database created by an older create_tables() up to date without touching its data: replaces the
+    old note indexes (_INDEX_UPGRADE_SCRIPT) and builds the notes_fts content search index, indexing every
+    existing note. Until this has run, keyword search uses LIKE.
+    Run explicitly (`python -m KITCore.database_manager --upgrade`), as it can take a while on a large database.
+    """
+    conn = None
+    db_path = None
+    try:
+        conn, db_path = get_db_connection_and_path()
+        if conn is None:
+            _log.error("Cannot upgrade the schema of %s: database connection failed.", db_path)
+            return False
+        has_notes, has_current_index, has_notes_fts = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes'), "
+            "EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_notes_original_latest_deleted'), "
+            "EXISTS (SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts')"
+        ).fetchone()
+        if not has_notes:
+            _log.error("Cannot upgrade the schema of %s: it has no notes table; run create_tables() to initialize it.", db_path)
+            return False
+        if not has_current_index:
+            print(f"Upgrading note indexes in {db_path}...")
+            conn.executescript(_INDEX_UPGRADE_SCRIPT)
+        if not has_notes_fts:
+            print(f"Building the note content search index in {db_path}...")
+            if _create_notes_fts(conn):
+                print(f"Note content search index built in {db_path}.")
+        print(f"Database schema at {db_path} is up to date.")
+        return True
+    except sqlite3.Error as e:
+        _log.error("Database error during schema upgrade for %s: %s", db_path, e)
+        return False
+    finally:
+        if conn:
+            conn.close()
+
 def set_setting(key: str, value: str) -> bool:
     """Saves or updates a setting in the user_settings table. Returns True on success, False on error."""
     conn = None
-    db_path, _ = _get_effective_db_path_and_dir()
+    db_path = None
     try:
-        conn = get_db_connection()
+        conn, db_path = get_db_connection_and_path()
         if conn is None:
-            print(f"Cannot set setting '{key}' for {db_path}: database connection failed.", file=sys.stderr)
+            _log.error("Cannot set setting '%s' for %s: database connection failed.", key, db_path)
             return False
         cursor = conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)", (key, value))
+        cursor.execute(UPSERT_SETTING_SQL, (key, value))
         conn.commit()
         # print(f"Setting '{key}' saved.") # This is for CLI, KITCore.py will handle output
         return True
     except sqlite3.Error as e:
-        print(f"Database error when setting setting '{key}' for {db_path}: {e}", file=sys.stderr)
+        _log.error("Database error when setting setting '%s' for %s: %s", key, db_path, e)
         return False
     finally:
         if conn:
@@ -185,29 +403,31 @@ def set_setting(key: str, value: str) -> bool:
 def get_setting(key: str):
     """Retrieves a setting from the user_settings table. Returns value or None if not found/error."""
     conn = None
-    db_path, _ = _get_effective_db_path_and_dir()
+    db_path = None
     try:
-        conn = get_db_connection()
+        conn, db_path = get_db_connection_and_path()
         if conn is None:
-            print(f"Cannot get setting '{key}' for {db_path}: database connection failed.", file=sys.stderr)
+            _log.error("Cannot get setting '%s' for %s: database connection failed.", key, db_path)
             return None
         cursor = conn.cursor()
-        cursor.execute("SELECT setting_value FROM user_settings WHERE setting_key = ?", (key,))
+        cursor.execute(GET_SETTING_SQL, (key,))
         row = cursor.fetchone()
         if row:
             return row['setting_value']
         # print(f"Setting '{key}' not found.") # Let caller decide how to handle not found
         return None
     except sqlite3.Error as e:
-        print(f"Database error when getting setting '{key}' for {db_path}: {e}", file=sys.stderr)
+        _log.error("Database error when getting setting '%s' for %s: %s", key, db_path, e)
         return None
     finally:
         if conn:
             conn.close()
 
 if __name__ == '__main__':
-    # This allows running this script directly to initialize the database
+    # This allows running this script directly to initialize the database, or with --upgrade to upgrade it in place
     db_path_for_direct_run, _ = _get_effective_db_path_and_dir()
+    if "--upgrade" in sys.argv[1:]:
+        sys.exit(0 if upgrade_schema() else 1)
     print(f"Attempting to initialize database directly using path: {db_path_for_direct_run}")
     if create_tables():
         print(f"Database initialized successfully from direct script run at {db_path_for_direct_run}.")
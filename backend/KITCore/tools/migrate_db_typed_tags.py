@@ -3,6 +3,7 @@ import os
 import sys
 import json
 from datetime import datetime
+from urllib.request import pathname2url
 
 # --- Configuration ---
 # Determine the project root so we can correctly path to the database and config
@@ -30,6 +31,25 @@ if BACKEND_DIR not in sys.path:
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
+# The target is a fresh file written in one shot; if the run crashes it is simply re-created, so durability
+# is traded for bulk-load speed until migrate_data() restores normal settings at the end.
+TARGET_BULK_LOAD_PRAGMAS = """
+PRAGMA synchronous = OFF;
+PRAGMA journal_mode = MEMORY;
+PRAGMA temp_store = MEMORY;
+PRAGMA locking_mode = EXCLUSIVE;
+PRAGMA cache_size = -200000;
+"""
+# Applied once the data is committed: WAL matches what KITCore.database_manager uses for the live database.
+TARGET_DURABLE_PRAGMAS = """
+PRAGMA locking_mode = NORMAL;
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = FULL;
+"""
+
+# Prepared statements kept per connection, as in KITCore.database_manager.
+CACHED_STATEMENTS = 256
+
 # --- Database Connection Functions ---
 def get_db_connection(db_path):
     """Establishes and returns a SQLite database connection."""
@@ -38,8 +58,11 @@ def get_db_connection(db_path):
         if db_path == TARGET_DB_PATH:
             os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row # Access columns by name
+        conn = sqlite3.connect(db_path, uri=True, cached_statements=CACHED_STATEMENTS) # uri=True lets migrate_data ATTACH the source read-only
+        if db_path != TARGET_DB_PATH: # The target only reads back a few rows, unpacked positionally
+            conn.row_factory = sqlite3.Row # Access columns by name
+        if db_path == TARGET_DB_PATH:
+            conn.executescript(TARGET_BULK_LOAD_PRAGMAS)
         print(f"Successfully connected to database: {db_path}")
         return conn
     except sqlite3.Error as e:
@@ -50,12 +73,66 @@ def get_db_connection(db_path):
         return None
 
 # --- Schema Creation for Target DB (Copied and adapted from database_manager.py) ---
+# Notes Table (same as original)
+NOTES_TABLE_SQL = """
+CREATE TABLE notes (
+    note_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_note_id INTEGER,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_latest_version BOOLEAN NOT NULL CHECK (is_latest_version IN (0, 1)),
+    properties_json TEXT,
+    is_deleted BOOLEAN DEFAULT 0 NOT NULL CHECK (is_deleted IN (0, 1)),
+    deleted_at TIMESTAMP,
+    FOREIGN KEY (original_note_id) REFERENCES notes(note_id)
+);
+"""
+
+# Tags Table (NEW SCHEMA with type and value)
+# Uniqueness of (tag_type, tag_value) is enforced by idx_tags_type_value, which migrate_data()
+# builds after the tags are loaded rather than updating it on every insert.
+TAGS_TABLE_SQL = """
+CREATE TABLE tags (
+    tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag_type TEXT NOT NULL DEFAULT 'general',
+    tag_value TEXT NOT NULL
+);
+"""
+
+# Note_Tags Junction Table (same as original, stored WITHOUT ROWID like KITCore.database_manager's)
+# Added ON DELETE CASCADE for robustness during migration steps if re-run/cleaned.
+NOTE_TAGS_TABLE_SQL = """
+CREATE TABLE note_tags (
+    note_version_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (note_version_id, tag_id),
+    FOREIGN KEY (note_version_id) REFERENCES notes(note_id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags(tag_id) ON DELETE CASCADE
+) WITHOUT ROWID;
+"""
+
+# Columns of NOTES_TABLE_SQL, copied as-is from the source's notes table.
+NOTES_COLUMNS = ("note_id", "original_note_id", "content", "created_at", "is_latest_version", "properties_json", "is_deleted", "deleted_at")
+# Rows are inserted in primary-key order so SQLite appends to the rightmost leaf instead of splitting pages.
+NOTES_COPY_SQL = f"INSERT INTO notes ({', '.join(NOTES_COLUMNS)}) SELECT {', '.join(NOTES_COLUMNS)} FROM src.notes ORDER BY note_id"
+
+# User Settings Table (same as original)
+USER_SETTINGS_TABLE_SQL = """
+CREATE TABLE user_settings (
+    setting_key TEXT PRIMARY KEY,
+    setting_value TEXT
+);
+"""
+
+def _normalize_table_sql(sql):
+    """Whitespace-insensitive form of a CREATE TABLE statement, for comparing against sqlite_master.sql."""
+    return " ".join(sql.replace("(", " ( ").replace(")", " ) ").replace(",", " , ").split()).rstrip(" ;")
+
 def create_tables_in_target(conn):
     """Creates the necessary tables in the target database with the new schema."""
     db_path = TARGET_DB_PATH # For messages
     try:
         cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = OFF;") # Turn off for DDL initially
 
         # Drop tables if they exist (for a clean run of the script)
         cursor.execute("DROP TABLE IF EXISTS note_tags;")
@@ -64,53 +141,12 @@ def create_tables_in_target(conn):
         cursor.execute("DROP TABLE IF EXISTS user_settings;")
         print(f"Existing tables (if any) dropped in {db_path}.")
 
-        # Notes Table (same as original)
-        cursor.execute("""
-        CREATE TABLE notes (
-            note_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            original_note_id INTEGER,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_latest_version BOOLEAN NOT NULL CHECK (is_latest_version IN (0, 1)),
-            properties_json TEXT,
-            is_deleted BOOLEAN DEFAULT 0 NOT NULL CHECK (is_deleted IN (0, 1)),
-            deleted_at TIMESTAMP,
-            FOREIGN KEY (original_note_id) REFERENCES notes(note_id)
-        );
-        """)
-
-        # Tags Table (NEW SCHEMA with type and value)
-        cursor.execute("""
-        CREATE TABLE tags (
-            tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tag_type TEXT NOT NULL DEFAULT 'general',
-            tag_value TEXT NOT NULL,
-            UNIQUE (tag_type, tag_value)
-        );
-        """)
-
-        # Note_Tags Junction Table (same as original)
-        cursor.execute("""
-        CREATE TABLE note_tags (
-            note_version_id INTEGER NOT NULL,
-            tag_id INTEGER NOT NULL,
-            PRIMARY KEY (note_version_id, tag_id),
-            FOREIGN KEY (note_version_id) REFERENCES notes(note_id) ON DELETE CASCADE,
-            FOREIGN KEY (tag_id) REFERENCES tags(tag_id) ON DELETE CASCADE
-        );
-        """)
-        # Added ON DELETE CASCADE for robustness during migration steps if re-run/cleaned.
-
-        # User Settings Table (same as original)
-        cursor.execute("""
-        CREATE TABLE user_settings (
-            setting_key TEXT PRIMARY KEY,
-            setting_value TEXT
-        );
-        """)
+        cursor.execute(NOTES_TABLE_SQL)
+        cursor.execute(TAGS_TABLE_SQL)
+        cursor.execute(NOTE_TAGS_TABLE_SQL)
+        cursor.execute(USER_SETTINGS_TABLE_SQL)
         
         conn.commit()
-        cursor.execute("PRAGMA foreign_keys = ON;") # Turn back on
         print(f"Database tables created successfully in {db_path}")
         return True
     except sqlite3.Error as e:
@@ -122,132 +158,179 @@ def create_tables_in_target(conn):
         if conn: conn.rollback()
         return False
 
+def snapshot_source_into_target(source_db_path, target_db_path):
+    """
+    Copies the whole source database to `target_db_path` with VACUUM INTO, a page-level copy, when its notes and
+    user_settings tables are declared exactly as in the new schema. Returns True if the snapshot was written;
+    False means the schemas differ (or the copy failed) and the tables must be created and filled row by row.
+    """
+    try:
+        source_conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(source_db_path))}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        print(f"Could not open source database {source_db_path} for snapshot: {e}", file=sys.stderr)
+        return False
+    try:
+        source_table_sql = dict(source_conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ('notes', 'user_settings')"))
+        for table_name, expected_sql in (("notes", NOTES_TABLE_SQL), ("user_settings", USER_SETTINGS_TABLE_SQL)):
+            if _normalize_table_sql(source_table_sql.get(table_name) or "") != _normalize_table_sql(expected_sql):
+                print(f"Source '{table_name}' table differs from the new schema; copying rows instead of snapshotting.")
+                return False
+        source_conn.execute("VACUUM INTO ?", (target_db_path,))
+        print(f"Snapshotted source database into {target_db_path} with VACUUM INTO.")
+        return True
+    except sqlite3.Error as e:
+        print(f"VACUUM INTO {target_db_path} failed, falling back to copying rows: {e}", file=sys.stderr)
+        if os.path.exists(target_db_path): # Don't build on a partially written snapshot
+            os.remove(target_db_path)
+        return False
+    finally:
+        source_conn.close()
+
+def rebuild_tag_tables_in_target(conn):
+    """Replaces the snapshotted old-schema tags/note_tags tables with the typed-tag schema (notes and settings are kept)."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE IF EXISTS note_tags;")
+        cursor.execute("DROP TABLE IF EXISTS tags;")
+        cursor.execute(TAGS_TABLE_SQL)
+        cursor.execute(NOTE_TAGS_TABLE_SQL)
+        conn.commit()
+        print(f"Tag tables rebuilt with the typed-tag schema in {TARGET_DB_PATH}")
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error while rebuilding tag tables in {TARGET_DB_PATH}: {e}", file=sys.stderr)
+        conn.rollback()
+        return False
+
+def write_warnings(messages):
+    """Writes a phase's collected warnings to stderr with a single write instead of one print per row."""
+    if messages:
+        sys.stderr.write("\n".join(messages) + "\n")
+        sys.stderr.flush()
+
+def normalize_tag_name(tag_name):
+    """Old free-form tag names become 'general' tag values: surrounding whitespace removed, lowercased."""
+    return tag_name.strip().lower()
+
+# The data phases of the migration, run as one script inside a single write transaction (see migrate_data).
+# Tags: each distinct normalized name is inserted once, in order of its first old tag_id, so new IDs follow the
+# old ordering; old tags that normalize to the same value (e.g. differing only in case) share one new tag.
+# normalize_tag() is normalize_tag_name() registered on the connection, so SQL and Python agree exactly.
+# Uniqueness is enforced by an index built after the load, and the old->new ID map is kept in a temp table
+# so the note_tags remap is a join.
+MIGRATE_TAGS_SQL = """
+INSERT INTO tags (tag_type, tag_value)
+SELECT 'general', tag_value FROM (
+    SELECT normalize_tag(tag_name) AS tag_value, MIN(tag_id) AS first_old_tag_id FROM src.tags GROUP BY 1
+) ORDER BY first_old_tag_id;
+CREATE UNIQUE INDEX idx_tags_type_value ON tags (tag_type, tag_value);
+CREATE TEMP TABLE tag_id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL);
+INSERT INTO tag_id_map (old_id, new_id)
+SELECT s.tag_id, t.tag_id FROM src.tags s JOIN tags t ON t.tag_type = 'general' AND t.tag_value = normalize_tag(s.tag_name);
+"""
+# Note IDs (note_version_id) are unchanged, since all notes keep their original IDs. Remapped tag IDs break the
+# source order; sorting keeps the WITHOUT ROWID inserts append-only. Relations with an unmapped tag are dropped.
+MIGRATE_NOTE_TAGS_SQL = """
+INSERT INTO note_tags (note_version_id, tag_id)
+SELECT nt.note_version_id, m.new_id FROM src.note_tags nt JOIN tag_id_map m ON m.old_id = nt.tag_id
+ORDER BY nt.note_version_id, m.new_id;
+"""
+MIGRATE_USER_SETTINGS_SQL = """
+INSERT OR REPLACE INTO user_settings (setting_key, setting_value) SELECT setting_key, setting_value FROM src.user_settings;
+"""
+# Old tags merged into a tag first created from a lower old tag_id, and relations pointing at unknown old tags.
+SELECT_MERGED_TAGS_SQL = """
+SELECT m.old_id, t.tag_type, t.tag_value FROM tag_id_map m JOIN tags t ON t.tag_id = m.new_id
+WHERE m.old_id > (SELECT MIN(first.old_id) FROM tag_id_map first WHERE first.new_id = m.new_id)
+ORDER BY m.old_id
+"""
+SELECT_SKIPPED_RELATIONS_SQL = """
+SELECT nt.note_version_id, nt.tag_id FROM src.note_tags nt
+LEFT JOIN tag_id_map m ON m.old_id = nt.tag_id WHERE m.new_id IS NULL
+"""
+
+def build_migration_script(copy_notes_and_settings, notes_copy_sql=NOTES_COPY_SQL):
+    """Assembles the BEGIN ... COMMIT script for migrate_data(); notes/settings are left out for a VACUUM INTO snapshot."""
+    statements = ["BEGIN IMMEDIATE;", MIGRATE_TAGS_SQL]
+    if copy_notes_and_settings:
+        statements.append(notes_copy_sql + ";")
+    statements.append(MIGRATE_NOTE_TAGS_SQL)
+    if copy_notes_and_settings:
+        statements.append(MIGRATE_USER_SETTINGS_SQL)
+    statements.append("COMMIT;")
+    return "\n".join(statements)
+
 # --- Migration Logic Placeholder ---
-def migrate_data(source_conn, target_conn):
+def migrate_data(target_conn, copy_notes_and_settings=True):
+    """
+    Copies and converts the data from SOURCE_DB_PATH, attached to `target_conn` as "src", into the target tables.
+    Pass copy_notes_and_settings=False when the target is a VACUUM INTO snapshot that already holds them.
+    """
     print("Starting data migration...")
-    source_cursor = source_conn.cursor()
     target_cursor = target_conn.cursor()
 
-    # Turn off foreign keys for the duration of data insertion in target
-    target_cursor.execute("PRAGMA foreign_keys = OFF;")
-    target_conn.commit()
-
+    # Foreign keys stay off (a new connection's default) for the whole load; they are checked once at the end.
 
-    # 1. Migrate Tags
-    print("Migrating tags...")
-    source_cursor.execute("SELECT tag_id, tag_name FROM tags") # Old schema
-    old_tags = source_cursor.fetchall()
-    
-    old_to_new_tag_id_map = {}
-    new_tag_id_counter = 1 # Simple counter if not relying on AUTOINCREMENT during this phase for mapping
-
-    for old_tag in old_tags:
-        old_tag_id = old_tag['tag_id']
-        old_tag_name = old_tag['tag_name'].strip().lower()
-        
-        # Default to 'general' type for all old tags
-        tag_type = 'general'
-        tag_value = old_tag_name
+    # Attach the source read-only: every read goes through this one connection, and all rows are copied
+    # inside SQLite with INSERT ... SELECT.
+    # ATTACH/DETACH are not allowed inside a transaction, so this happens before BEGIN and after the commit.
+    target_cursor.execute("ATTACH DATABASE ? AS src", (f"file:{pathname2url(os.path.abspath(SOURCE_DB_PATH))}?mode=ro",))
+    target_conn.create_function("normalize_tag", 1, normalize_tag_name, deterministic=True)
 
+    # All phases run as one script in one explicit write transaction: the journal is synced once at the final
+    # COMMIT, and a run that fails part-way leaves nothing behind in the target.
+    print("Migrating tags, notes, note-tag relationships and user settings..." if copy_notes_and_settings
+          else "Migrating tags and note-tag relationships...")
+    try:
         try:
-            target_cursor.execute("INSERT INTO tags (tag_type, tag_value) VALUES (?, ?)", (tag_type, tag_value))
-            new_tag_id = target_cursor.lastrowid
-            if new_tag_id is not None:
-                 old_to_new_tag_id_map[old_tag_id] = new_tag_id
-            else: # Should not happen if insert is successful
-                print(f"Warning: Failed to get new_tag_id for old_tag_id {old_tag_id} ('{tag_type}':'{tag_value}') after insert. Attempting select.", file=sys.stderr)
-                target_cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-                refetched_tag = target_cursor.fetchone()
-                if refetched_tag:
-                    old_to_new_tag_id_map[old_tag_id] = refetched_tag['tag_id']
-                else:
-                    print(f"CRITICAL: Still could not get new_tag_id for '{tag_type}':'{tag_value}'. Skipping tag id mapping for old_id {old_tag_id}", file=sys.stderr)
-
-        except sqlite3.IntegrityError: # Unique constraint (tag_type, tag_value) violated
-            # This means this (type, value) combination was already inserted (e.g. from a differently-cased old tag that normalized to the same)
-            print(f"Warning: Tag '{tag_type}':'{tag_value}' (from old_id {old_tag_id}) already exists. Mapping to existing new tag.", file=sys.stderr)
-            target_cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-            existing_tag = target_cursor.fetchone()
-            if existing_tag:
-                old_to_new_tag_id_map[old_tag_id] = existing_tag['tag_id']
-            else:
-                print(f"CRITICAL: Could not find existing tag '{tag_type}':'{tag_value}' after integrity error. Skipping mapping for old_id {old_tag_id}", file=sys.stderr)
-    target_conn.commit() # Commit tags
-    print(f"Finished migrating tags. {len(old_to_new_tag_id_map)} tags mapped.")
-
-
-    # 2. Migrate Notes (Assuming schema is identical for notes table structure)
-    print("Migrating notes...")
-    # Get all columns from source notes table to be safe
-    source_cursor.execute("PRAGMA table_info(notes)")
-    notes_columns = [col['name'] for col in source_cursor.fetchall()]
-    notes_columns_str = ", ".join(notes_columns)
-    placeholders = ", ".join(["?"] * len(notes_columns))
-
-    source_cursor.execute(f"SELECT {notes_columns_str} FROM notes")
-    all_notes = source_cursor.fetchall()
-    
-    notes_to_insert = []
-    for note_row in all_notes:
-        notes_to_insert.append(tuple(note_row))
-
-    if notes_to_insert:
-        target_cursor.executemany(f"INSERT INTO notes ({notes_columns_str}) VALUES ({placeholders})", notes_to_insert)
-    target_conn.commit() # Commit notes
-    print(f"Finished migrating {len(all_notes)} notes.")
-
-    # 3. Migrate Note-Tag Relationships
-    print("Migrating note-tag relationships...")
-    source_cursor.execute("SELECT note_version_id, tag_id FROM note_tags") # Old schema
-    old_note_tags = source_cursor.fetchall()
-    
-    new_note_tags_to_insert = []
-    skipped_relations_count = 0
-    for old_relation in old_note_tags:
-        old_note_version_id = old_relation['note_version_id']
-        old_tag_id = old_relation['tag_id']
-        
-        new_tag_id = old_to_new_tag_id_map.get(old_tag_id)
-        
-        if new_tag_id is not None:
-            # Note IDs (note_version_id) are assumed to be the same as they are auto-incrementing
-            # and we inserted all notes preserving their original IDs.
-            new_note_tags_to_insert.append((old_note_version_id, new_tag_id))
-        else:
-            print(f"Warning: Could not find new_tag_id for old_tag_id {old_tag_id} when migrating note_tags. Skipping relation for note_version_id {old_note_version_id}.", file=sys.stderr)
-            skipped_relations_count +=1
-            
-    if new_note_tags_to_insert:
-        target_cursor.executemany("INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)", new_note_tags_to_insert)
-    target_conn.commit() # Commit note_tags
-    print(f"Finished migrating {len(new_note_tags_to_insert)} note-tag relationships. Skipped {skipped_relations_count} due to unmapped tags.")
-
-    # 4. Migrate User Settings (Assuming schema is identical)
-    print("Migrating user settings...")
-    source_cursor.execute("SELECT setting_key, setting_value FROM user_settings")
-    all_settings = source_cursor.fetchall()
-    
-    settings_to_insert = []
-    for setting_row in all_settings:
-        settings_to_insert.append(tuple(setting_row))
-        
-    if settings_to_insert:
-        target_cursor.executemany("INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)", settings_to_insert)
-    target_conn.commit() # Commit settings
-    print(f"Finished migrating {len(all_settings)} user settings.")
-
-    # Re-enable foreign keys
-    target_cursor.execute("PRAGMA foreign_keys = ON;")
-    target_conn.commit()
-    
-    # Optional: Integrity Check
+            target_conn.executescript(build_migration_script(copy_notes_and_settings))
+        except sqlite3.OperationalError as e:
+            if not copy_notes_and_settings or "no such column" not in str(e):
+                raise
+            # An older source may lack some of the notes columns; rerun copying whichever ones it has.
+            target_conn.rollback()
+            print(f"Source notes table does not match the new column list ({e}); copying its own columns.", file=sys.stderr)
+            target_cursor.execute("PRAGMA src.table_info(notes)")
+            notes_columns_str = ", ".join(col[1] for col in target_cursor.fetchall()) # (cid, name, type, notnull, dflt_value, pk)
+            target_conn.executescript(build_migration_script(
+                True, f"INSERT INTO notes ({notes_columns_str}) SELECT {notes_columns_str} FROM src.notes ORDER BY note_id"))
+    except sqlite3.Error:
+        if target_conn.in_transaction:
+            target_conn.rollback()
+        raise
+
+    # Reports, read back after the commit
+    write_warnings([f"Warning: Tag '{tag_type}':'{tag_value}' (from old_id {old_tag_id}) already exists. Mapping to existing new tag."
+                    for old_tag_id, tag_type, tag_value in target_cursor.execute(SELECT_MERGED_TAGS_SQL)])
+    skipped_relation_warnings = [
+        f"Warning: Could not find new_tag_id for old_tag_id {skipped_tag_id} when migrating note_tags. Skipping relation for note_version_id {skipped_note_version_id}."
+        for skipped_note_version_id, skipped_tag_id in target_cursor.execute(SELECT_SKIPPED_RELATIONS_SQL)
+    ]
+    write_warnings(skipped_relation_warnings)
+    # The target tables were empty before the script, so their sizes are the migrated counts.
+    mapped_tags_count, notes_count, relations_count, settings_count = target_cursor.execute(
+        "SELECT (SELECT COUNT(*) FROM temp.tag_id_map), (SELECT COUNT(*) FROM notes), "
+        "(SELECT COUNT(*) FROM note_tags), (SELECT COUNT(*) FROM user_settings)").fetchone()
+    print(f"Finished migrating tags. {mapped_tags_count} tags mapped.")
+    if copy_notes_and_settings:
+        print(f"Finished migrating {notes_count} notes.")
+    print(f"Finished migrating {relations_count} note-tag relationships. Skipped {len(skipped_relation_warnings)} due to unmapped tags.")
+    if copy_notes_and_settings:
+        print(f"Finished migrating {settings_count} user settings.")
+    target_cursor.execute("DROP TABLE temp.tag_id_map")
+    target_cursor.execute("DETACH DATABASE src")
+
+    # Integrity Check (foreign_key_check works with enforcement off); enforcement is only turned on once it passes
     target_cursor.execute("PRAGMA foreign_key_check;")
     fk_violations = target_cursor.fetchall()
     if fk_violations:
         print(f"WARNING: Foreign key violations detected after migration: {fk_violations}", file=sys.stderr)
     else:
         print("Foreign key check passed successfully on target database.")
+        target_cursor.execute("PRAGMA foreign_keys = ON;")
 
+    target_conn.executescript(TARGET_DURABLE_PRAGMAS)
     print("Data migration completed.")
 
 
@@ -274,21 +357,26 @@ if __name__ == '__main__':
                 print(f"Error removing existing target database {TARGET_DB_PATH}: {e}", file=sys.stderr)
                 sys.exit(1)
 
-    source_conn = get_db_connection(SOURCE_DB_PATH)
+    # Fast path: page-level copy of the source when notes/user_settings need no conversion.
+    snapshotted = snapshot_source_into_target(SOURCE_DB_PATH, TARGET_DB_PATH)
+
+    # The source is read through the target connection (ATTACH in migrate_data), so only one connection is opened.
     target_conn = get_db_connection(TARGET_DB_PATH)
 
-    if source_conn is None or target_conn is None:
-        print("Failed to establish database connections. Aborting migration.", file=sys.stderr)
-        if source_conn: source_conn.close()
-        if target_conn: target_conn.close()
+    if target_conn is None:
+        print("Failed to establish database connection. Aborting migration.", file=sys.stderr)
         sys.exit(1)
 
     try:
-        if not create_tables_in_target(target_conn):
+        if snapshotted:
+            if not rebuild_tag_tables_in_target(target_conn):
+                print("Failed to rebuild tag tables in target database. Aborting.", file=sys.stderr)
+                sys.exit(1)
+        elif not create_tables_in_target(target_conn):
             print("Failed to create tables in target database. Aborting.", file=sys.stderr)
             sys.exit(1)
         
-        migrate_data(source_conn, target_conn)
+        migrate_data(target_conn, copy_notes_and_settings=not snapshotted)
         print(f"Migration successful. New database is at: {TARGET_DB_PATH}")
         print(f"Please verify the data in '{TARGET_DB_NAME}' and then, if correct, you can manually replace your original '{os.path.basename(KIT_DATABASE_PATH)}' with it.")
         print(f"(Original path was: {os.path.join(DB_DIR, os.path.basename(KIT_DATABASE_PATH))})")
@@ -298,8 +386,6 @@ if __name__ == '__main__':
         import traceback
         traceback.print_exc(file=sys.stderr)
     finally:
-        if source_conn:
-            source_conn.close()
         if target_conn:
             target_conn.close()
             
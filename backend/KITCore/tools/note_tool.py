@@ -1,12 +1,13 @@
 import sqlite3
 import json
+import functools
 import sys # Keep for other potential uses, but not for path manipulation here
 import os  # Keep for other potential uses
 from typing import Union, List, Dict, Tuple, Optional # Added typing imports
 from datetime import datetime, timedelta, timezone # Added for timestamping, timedelta and timezone
 
 # Use explicit relative import for modules within the same package (KITCore)
-from ..database_manager import get_db_connection, _get_effective_db_path_and_dir # Import for debugging path
+from ..database_manager import get_db_connection, notes_fts_enabled, _get_effective_db_path_and_dir # Import for debugging path
 # config.py is in the project root, which should be handled by the execution environment's Python path
 # If direct execution of this file is needed for testing, that script should set up sys.path
 
@@ -28,6 +29,70 @@ def _parse_tag_string(tag_string: str) -> Tuple[str, str]:
         tag_value = tag_string
     return tag_type, tag_value
 
+# RETURNING (used to get tag IDs back from the tag upsert) needs SQLite 3.35+.
+SQLITE_SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# The latest version of a note together with its tags, as a JSON array of [tag_type, tag_value] pairs,
+# so the versioning functions read everything they carry over in one query. The active variant is also
+# find_notes()' point query for a single original_note_id.
+_LATEST_VERSION_WITH_TAGS_SQL = """
+SELECT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json, n.is_latest_version, n.is_deleted,
+       json_group_array(json_array(t.tag_type, t.tag_value)) FILTER (WHERE t.tag_id IS NOT NULL) AS tags_json
+FROM notes n
+LEFT JOIN note_tags nt ON nt.note_version_id = n.note_id
+LEFT JOIN tags t ON t.tag_id = nt.tag_id
+WHERE n.original_note_id = ? AND n.is_latest_version = 1{}
+GROUP BY n.note_id
+"""
+SELECT_LATEST_VERSION_WITH_TAGS_SQL = _LATEST_VERSION_WITH_TAGS_SQL.format("")
+SELECT_ACTIVE_LATEST_VERSION_WITH_TAGS_SQL = _LATEST_VERSION_WITH_TAGS_SQL.format(" AND n.is_deleted = 0")
+
+# A new note is its own original, so original_note_id must equal the note_id SQLite is about to assign.
+# For an AUTOINCREMENT table that is one more than the larger of the sqlite_sequence entry and the current
+# MAX(note_id) (both cheap lookups); computing it inside the INSERT avoids a second write to the same row.
+CREATE_NOTE_SQL = """
+INSERT INTO notes (original_note_id, content, is_latest_version, properties_json)
+VALUES ((SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'notes'), 0), COALESCE(MAX(note_id), 0)) + 1 FROM notes), ?, ?, ?)
+"""
+
+def _link_tags_to_note_version(cursor: sqlite3.Cursor, note_version_id: int, tag_tuples: List[Tuple[str, str]], caller_name: str) -> None:
+    """
+    Links (type, value) tags to a note version, creating any tags that do not exist yet.
+    Uses two statements however many tags there are: one upsert returning every tag's ID, and one
+    batched INSERT into note_tags. SQLite older than 3.35 (no RETURNING) gets a batched INSERT OR IGNORE
+    followed by a SELECT of the IDs instead.
+    """
+    tag_tuples = list(tag_tuples)
+    if not tag_tuples:
+        return
+    distinct_tags = list(dict.fromkeys(tag_tuples)) # An upsert may not touch the same row twice
+    row_placeholders = ', '.join(['(?, ?)'] * len(distinct_tags))
+    flat_tag_params = [part for tag_tuple in distinct_tags for part in tag_tuple]
+    if SQLITE_SUPPORTS_RETURNING:
+        # The no-op DO UPDATE makes existing tags return their IDs too (DO NOTHING would return no row for them)
+        cursor.execute(
+            f"INSERT INTO tags (tag_type, tag_value) VALUES {row_placeholders}"
+            " ON CONFLICT (tag_type, tag_value) DO UPDATE SET tag_value = excluded.tag_value"
+            " RETURNING tag_id, tag_type, tag_value",
+            flat_tag_params
+        )
+    else:
+        cursor.executemany("INSERT OR IGNORE INTO tags (tag_type, tag_value) VALUES (?, ?)", distinct_tags)
+        cursor.execute(
+            f"SELECT tag_id, tag_type, tag_value FROM tags WHERE (tag_type, tag_value) IN (VALUES {row_placeholders})",
+            flat_tag_params
+        )
+    tag_ids = {(row['tag_type'], row['tag_value']): row['tag_id'] for row in cursor.fetchall()}
+
+    note_tag_rows = []
+    for tag_type, tag_value in tag_tuples:
+        tag_id = tag_ids.get((tag_type, tag_value))
+        if tag_id is None:
+            print(f"Warning: Could not find or create tag_id for tag_type='{tag_type}', tag_value='{tag_value}' in {caller_name}", file=sys.stderr)
+            continue
+        note_tag_rows.append((note_version_id, tag_id))
+    cursor.executemany("INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)", note_tag_rows)
+
 def create_note(content: str, tags_list: Optional[List[str]] = None, properties_dict: Optional[Dict[str, any]] = None) -> Optional[int]:
     print("!!! CREATE_NOTE FUNCTION WAS CALLED !!!", file=sys.stderr)
     """
@@ -50,13 +115,14 @@ def create_note(content: str, tags_list: Optional[List[str]] = None, properties_
             return None
         
         cursor = conn.cursor()
+        # One explicit write transaction for the note, its tags and their links, committed (and synced) once.
+        # IMMEDIATE takes the write lock up front, so the version reads in the update functions below
+        # cannot be invalidated by another writer before their own writes.
+        cursor.execute("BEGIN IMMEDIATE")
 
         props_json = json.dumps(properties_dict) if properties_dict else None
 
-        cursor.execute(
-            "INSERT INTO notes (content, is_latest_version, properties_json) VALUES (?, ?, ?)",
-            (content, 1, props_json) 
-        )
+        cursor.execute(CREATE_NOTE_SQL, (content, 1, props_json))
         new_note_id = cursor.lastrowid
 
         if not new_note_id:
@@ -65,28 +131,9 @@ def create_note(content: str, tags_list: Optional[List[str]] = None, properties_
             if conn: conn.rollback() # Attempt rollback before raising or returning
             return None # Or raise a custom exception
 
-        cursor.execute(
-            "UPDATE notes SET original_note_id = ? WHERE note_id = ?",
-            (new_note_id, new_note_id)
-        )
-
-        for tag_string in tags_list:
-            tag_type, tag_value = _parse_tag_string(tag_string)
-            if not tag_value: # Skip if the value part is empty after parsing
-                continue
-            
-            # Insert with type and value, using the new schema
-            cursor.execute("INSERT OR IGNORE INTO tags (tag_type, tag_value) VALUES (?, ?)", (tag_type, tag_value))
-            cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-            tag_row = cursor.fetchone()
-            if tag_row:
-                tag_id = tag_row['tag_id']
-                cursor.execute(
-                    "INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)",
-                    (new_note_id, tag_id)
-                )
-            else:
-                print(f"Warning: Could not find or create tag_id for tag_type='{tag_type}', tag_value='{tag_value}' in create_note", file=sys.stderr)
+        # Skip tags whose value part is empty after parsing
+        parsed_tags = [(tag_type, tag_value) for tag_type, tag_value in map(_parse_tag_string, tags_list) if tag_value]
+        _link_tags_to_note_version(cursor, new_note_id, parsed_tags, "create_note")
 
         print(f"NOTE_TOOL_DEBUG: create_note PRE-COMMIT for new_note_id: {new_note_id} in DB: {db_path_for_debug}", file=sys.stderr)
         conn.commit()
@@ -110,6 +157,120 @@ def create_note(content: str, tags_list: Optional[List[str]] = None, properties_
         if conn:
             conn.close()
 
+# Separator for the tag lists find_notes() gets from group_concat(): the ASCII unit separator, char(31),
+# a control character that typed or imported tag text has no use for.
+TAG_LIST_SEPARATOR = '\x1f'
+
+def _format_tag(tag_type: str, tag_value: str) -> str:
+    """Formats a typed tag the way notes are returned: 'type:value', or just the value for 'general' tags."""
+    return f"{tag_type}:{tag_value}" if tag_type != 'general' else tag_value
+
+def _note_dict_from_row(row_data: sqlite3.Row) -> Dict[str, any]:
+    """Converts a notes row into find_notes()' note dict, with 'properties' decoded and an empty 'tags' list."""
+    note: Dict[str, any] = dict(row_data)
+    if note.get('properties_json'):
+        try:
+            note['properties'] = json.loads(note['properties_json'])
+        except json.JSONDecodeError as je:
+            print(f"JSON decode error for note_id {note['note_id']}: {je}", file=sys.stderr)
+            note['properties'] = {}
+    else:
+        note['properties'] = {}
+    note['tags'] = [] # Initialize with empty list
+    return note
+
+def _parse_tag_filter(tag_strings: Optional[List[str]]) -> List[Tuple[str, str]]:
+    """Parses the tag strings of a find_notes() criterion, dropping blank entries."""
+    parsed_tags = [_parse_tag_string(tag) for tag in (tag_strings or []) if tag.strip()]
+    return [(tag_type, tag_value) for tag_type, tag_value in parsed_tags if tag_value]
+
+def _split_keywords_for_fts(keywords: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Splits content keywords into those the trigram notes_fts index can match and those kept on LIKE:
+    keywords shorter than a trigram, and keywords with LIKE wildcards ('%', '_'), which callers may rely on.
+    """
+    fts_keywords, like_keywords = [], []
+    for keyword in keywords:
+        if len(keyword) >= 3 and '%' not in keyword and '_' not in keyword:
+            fts_keywords.append(keyword)
+        else:
+            like_keywords.append(keyword)
+    return fts_keywords, like_keywords
+
+def _fts_phrase(keyword: str) -> str:
+    """Quotes a keyword as an FTS5 phrase so its characters are matched literally, not as query syntax."""
+    return '"' + keyword.replace('"', '""') + '"'
+
+@functools.lru_cache(maxsize=256)
+def _build_find_notes_sql(query_shape: Tuple) -> str:
+    """
+    Builds the find_notes() SQL for a query shape: the kind of search plus how many values each criterion has.
+    Equal shapes always give identical SQL text, so the text is cached here and the prepared statement is reused
+    from the connection's statement cache.
+    Shapes: ("versions", id_count, add_order_by), ("originals", id_count) and ("search", has_fts_match,
+    like_keyword_count, has_start_date, has_end_date, include_tag_count, any_tag_count, exclude_tag_count).
+    """
+    joins = ""
+    order_by = True
+    if query_shape[0] == "versions":
+        _, id_count, order_by = query_shape
+        query_base = "SELECT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json, n.is_latest_version, n.is_deleted, n.deleted_at FROM notes n"
+        conditions = [f"n.note_id IN ({', '.join('?' * id_count)})"]
+    elif query_shape[0] == "originals":
+        _, id_count = query_shape
+        query_base = "SELECT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json, n.is_latest_version, n.is_deleted FROM notes n"
+        conditions = [
+            f"n.original_note_id IN ({', '.join('?' * id_count)})",
+            "n.is_latest_version = 1",
+            "n.is_deleted = 0"
+        ]
+    else:
+        _, has_fts_match, like_keyword_count, has_start_date, has_end_date, include_tag_count, any_tag_count, exclude_tag_count = query_shape
+        # Base query selects notes that are latest and not deleted; only the any_of_tags join can repeat a note
+        select_distinct = "SELECT DISTINCT" if any_tag_count else "SELECT"
+        query_base = f"{select_distinct} n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json FROM notes n"
+        conditions = ["n.is_latest_version = 1", "n.is_deleted = 0"]
+        if has_fts_match:
+            # All indexable keywords as one FTS5 query against the notes_fts content index
+            conditions.append("n.note_id IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)")
+        conditions.extend(["n.content LIKE ?"] * like_keyword_count)
+        if has_start_date:
+            conditions.append("n.created_at >= ?")
+        if has_end_date:
+            conditions.append("n.created_at <= ?")
+
+        if include_tag_count:
+            # One aggregation instead of a join per included tag: a note qualifies when it has as many of the
+            # (distinct) included tags as were asked for.
+            conditions.append(
+                "n.note_id IN (SELECT nt_incl.note_version_id FROM note_tags nt_incl JOIN tags t_incl ON nt_incl.tag_id = t_incl.tag_id"
+                f" WHERE (t_incl.tag_type, t_incl.tag_value) IN (VALUES {', '.join(['(?, ?)'] * include_tag_count)})"
+                f" GROUP BY nt_incl.note_version_id HAVING COUNT(*) = {include_tag_count})"
+            )
+
+        if any_tag_count:
+            # A single join for "any_of_tags" with OR conditions on the tag values:
+            # the note has *at least one* of these tags.
+            joins += " JOIN note_tags nt_any ON n.note_id = nt_any.note_version_id JOIN tags t_any ON nt_any.tag_id = t_any.tag_id "
+            conditions.append(f"({' OR '.join(['(t_any.tag_type = ? AND t_any.tag_value = ?)'] * any_tag_count)})")
+
+        if exclude_tag_count:
+            # One anti-join against the set of note versions carrying any excluded tag,
+            # instead of a correlated NOT EXISTS per excluded tag
+            joins += (
+                " LEFT JOIN (SELECT DISTINCT nt_ex.note_version_id FROM note_tags nt_ex JOIN tags t_ex ON nt_ex.tag_id = t_ex.tag_id"
+                f" WHERE (t_ex.tag_type, t_ex.tag_value) IN (VALUES {', '.join(['(?, ?)'] * exclude_tag_count)})) x_ex"
+                " ON x_ex.note_version_id = n.note_id "
+            )
+            conditions.append("x_ex.note_version_id IS NULL")
+
+    query = query_base + joins
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        query += " ORDER BY n.created_at DESC"
+    return query
+
 def find_notes(content_keywords: Optional[List[str]] = None, 
                include_tags: Optional[List[str]] = None, # Renamed from 'tags' and matches new logic
                exclude_tags: Optional[List[str]] = None,
@@ -145,98 +306,57 @@ def find_notes(content_keywords: Optional[List[str]] = None,
 
         cursor = conn.cursor()
 
+        if original_note_ids and len(original_note_ids) == 1 and not specific_version_ids:
+            # Fast path for the common single-note lookup (e.g. read-after-write): one prepared point query
+            # returning the note and its tags, without the query builder or a separate tags query.
+            # Other criteria are ignored with original_note_ids, as in the general path below.
+            cursor.execute(SELECT_ACTIVE_LATEST_VERSION_WITH_TAGS_SQL, (original_note_ids[0],))
+            row_data = cursor.fetchone()
+            if row_data is None:
+                return notes_found
+            note = _note_dict_from_row(row_data)
+            note['tags'] = [_format_tag(tag_type, tag_value) for tag_type, tag_value in json.loads(note.pop('tags_json'))]
+            return [note]
+
         params: List[any] = []
-        joins = ""
 
         if specific_version_ids: # Prioritize search by specific version IDs
-            placeholders = ', '.join('?' * len(specific_version_ids))
-            query_base = "SELECT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json, n.is_latest_version, n.is_deleted, n.deleted_at FROM notes n"
-            conditions = [f"n.note_id IN ({placeholders})"]
+            query = _build_find_notes_sql(("versions", len(specific_version_ids), not original_note_ids))
             params.extend(specific_version_ids)
         elif original_note_ids:
-            # Diagnostic: Simplify query drastically if only original_note_ids are provided
-            placeholders = ', '.join('?' * len(original_note_ids))
-            # Ensure we select from notes table aliased as 'n'
-            query_base = "SELECT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json, n.is_latest_version, n.is_deleted FROM notes n"
             # ALWAYS filter for latest and not deleted, even with original_note_ids
-            conditions = [
-                f"n.original_note_id IN ({placeholders})",
-                "n.is_latest_version = 1",
-                "n.is_deleted = 0"
-            ]
+            query = _build_find_notes_sql(("originals", len(original_note_ids)))
             params.extend(original_note_ids)
         else:
-            # Base query selects distinct notes that are latest and not deleted (original logic)
-            query_base = "SELECT DISTINCT n.note_id, n.original_note_id, n.content, n.created_at, n.properties_json FROM notes n"
-            conditions = ["n.is_latest_version = 1", "n.is_deleted = 0"]
-            # Keyword search
-            if content_keywords:
-                for keyword in content_keywords:
-                    keyword = keyword.strip()
-                    if keyword:
-                        conditions.append("n.content LIKE ?")
-                        params.append(f"%{keyword}%")
-            
-            if date_range and len(date_range) == 2:
-                start_date, end_date = date_range
-                if start_date:
-                    conditions.append("n.created_at >= ?")
-                    params.append(start_date)
-                if end_date:
-                    conditions.append("n.created_at <= ?")
-                    params.append(end_date)
-
-            tag_join_counter = 0
-
-            if include_tags:
-                parsed_include_tags = [_parse_tag_string(tag) for tag in include_tags if tag.strip()]
-                if parsed_include_tags:
-                    for tag_type, tag_value in parsed_include_tags:
-                        if not tag_value: continue
-                        joins += f" JOIN note_tags nt_incl_{tag_join_counter} ON n.note_id = nt_incl_{tag_join_counter}.note_version_id JOIN tags t_incl_{tag_join_counter} ON nt_incl_{tag_join_counter}.tag_id = t_incl_{tag_join_counter}.tag_id "
-                        conditions.append(f"(t_incl_{tag_join_counter}.tag_type = ? AND t_incl_{tag_join_counter}.tag_value = ?)")
-                        params.extend([tag_type, tag_value])
-                        tag_join_counter += 1
-            
-            if any_of_tags:
-                parsed_any_tags = [_parse_tag_string(tag) for tag in any_of_tags if tag.strip()]
-                if parsed_any_tags:
-                    any_tag_conditions = []
-                    # Each any_tag needs its own join to check its type and value
-                    # The overall condition is that AT LEAST ONE of these joins/conditions is met
-                    # This requires a more complex structure, typically using a subquery or ORing groups of joins
-                    # For simplicity here, we'll try to construct OR conditions for the tag checks on a single join if possible,
-                    # but this might mean the note has *at least one* of these tags.
-                    
-                    # Create a single join for "any_of_tags" and then use OR conditions on the tag values
-                    joins += f" JOIN note_tags nt_any_{tag_join_counter} ON n.note_id = nt_any_{tag_join_counter}.note_version_id JOIN tags t_any_{tag_join_counter} ON nt_any_{tag_join_counter}.tag_id = t_any_{tag_join_counter}.tag_id "
-                    any_tag_sub_conditions = []
-                    for tag_type, tag_value in parsed_any_tags:
-                        if not tag_value: continue
-                        any_tag_sub_conditions.append(f"(t_any_{tag_join_counter}.tag_type = ? AND t_any_{tag_join_counter}.tag_value = ?)")
-                        params.extend([tag_type, tag_value])
-                    
-                    if any_tag_sub_conditions:
-                        conditions.append(f"({ ' OR '.join(any_tag_sub_conditions) })")
-                    tag_join_counter += 1 # Increment if join was added
-
-
-            if exclude_tags:
-                parsed_exclude_tags = [_parse_tag_string(tag) for tag in exclude_tags if tag.strip()]
-                if parsed_exclude_tags:
-                    for i, (tag_type, tag_value) in enumerate(parsed_exclude_tags):
-                        if not tag_value: continue
-                        # Using NOT EXISTS for each excluded typed tag
-                        conditions.append(f"NOT EXISTS (SELECT 1 FROM note_tags nt_ex JOIN tags t_ex ON nt_ex.tag_id = t_ex.tag_id WHERE nt_ex.note_version_id = n.note_id AND t_ex.tag_type = ? AND t_ex.tag_value = ?)")
-                        params.extend([tag_type, tag_value])
-
-        query = query_base + joins
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        if not original_note_ids: # Add sorting only for general searches
-            query += " ORDER BY n.created_at DESC"
-        elif original_note_ids and len(conditions) > 1: # If other conditions were somehow added with original_ids
-             query += " ORDER BY n.created_at DESC"
+            # Only the number of each kind of criterion goes into the SQL text; the values are bound in the
+            # same order _build_find_notes_sql() emits their placeholders: the excluded tags (in the FROM
+            # clause) first, then the WHERE conditions.
+            parsed_include_tags = list(dict.fromkeys(_parse_tag_filter(include_tags))) # Distinct, for the HAVING COUNT(*) match
+            parsed_any_tags = _parse_tag_filter(any_of_tags)
+            parsed_exclude_tags = _parse_tag_filter(exclude_tags)
+            for tag_type, tag_value in parsed_exclude_tags:
+                params.extend([tag_type, tag_value])
+
+            keywords = [keyword.strip() for keyword in (content_keywords or []) if keyword.strip()]
+            fts_keywords, like_keywords = _split_keywords_for_fts(keywords) if notes_fts_enabled(conn) else ([], keywords)
+            if fts_keywords:
+                params.append(" AND ".join(_fts_phrase(keyword) for keyword in fts_keywords))
+            params.extend(f"%{keyword}%" for keyword in like_keywords)
+
+            start_date, end_date = date_range if date_range and len(date_range) == 2 else (None, None)
+            if start_date:
+                params.append(start_date)
+            if end_date:
+                params.append(end_date)
+
+            for parsed_tags in (parsed_include_tags, parsed_any_tags):
+                for tag_type, tag_value in parsed_tags:
+                    params.extend([tag_type, tag_value])
+
+            query = _build_find_notes_sql((
+                "search", bool(fts_keywords), len(like_keywords), bool(start_date), bool(end_date),
+                len(parsed_include_tags), len(parsed_any_tags), len(parsed_exclude_tags)
+            ))
 
         # print(f"NOTE_TOOL_DEBUG: find_notes EXECUTING QUERY: {query} with PARAMS: {params}", file=sys.stderr) # Temporarily commented out
         cursor.execute(query, params)
@@ -248,35 +368,22 @@ def find_notes(content_keywords: Optional[List[str]] = None,
 
         for row_data in rows:
             note_id = row_data['note_id']
-            note: Dict[str, any] = dict(row_data)
-            if note.get('properties_json'):
-                try:
-                    note['properties'] = json.loads(note['properties_json'])
-                except json.JSONDecodeError as je:
-                    print(f"JSON decode error for note_id {note_id}: {je}", file=sys.stderr)
-                    note['properties'] = {}
-            else:
-                note['properties'] = {}
-            note['tags'] = [] # Initialize with empty list
-            notes_by_id[note_id] = note
+            notes_by_id[note_id] = _note_dict_from_row(row_data)
             if note_id not in note_ids_for_tags_query: # Should always be true if rows are unique by note_id
                 note_ids_for_tags_query.append(note_id)
 
         if note_ids_for_tags_query:
             tags_query_placeholders = ', '.join('?' * len(note_ids_for_tags_query))
             tag_cursor = conn.cursor()
+            # Tags are formatted (as _format_tag() does) and concatenated per note by SQLite, one row per note
             tag_cursor.execute(
-                f"SELECT nt.note_version_id, t.tag_type, t.tag_value FROM tags t JOIN note_tags nt ON t.tag_id = nt.tag_id WHERE nt.note_version_id IN ({tags_query_placeholders})", 
+                "SELECT nt.note_version_id, group_concat(CASE WHEN t.tag_type = 'general' THEN t.tag_value ELSE t.tag_type || ':' || t.tag_value END, char(31)) AS tags"
+                f" FROM tags t JOIN note_tags nt ON t.tag_id = nt.tag_id WHERE nt.note_version_id IN ({tags_query_placeholders}) GROUP BY nt.note_version_id",
                 tuple(note_ids_for_tags_query)
             )
-            all_note_tags_rows = tag_cursor.fetchall()
-            
-            for tag_row in all_note_tags_rows:
-                note_id_for_tag = tag_row['note_version_id']
-                ttype, tvalue = tag_row['tag_type'], tag_row['tag_value']
-                formatted_tag = f"{ttype}:{tvalue}" if ttype != 'general' else tvalue
+            for note_id_for_tag, tags_str in tag_cursor.fetchall():
                 if note_id_for_tag in notes_by_id:
-                    notes_by_id[note_id_for_tag]['tags'].append(formatted_tag)
+                    notes_by_id[note_id_for_tag]['tags'] = tags_str.split(TAG_LIST_SEPARATOR)
         
         notes_found = list(notes_by_id.values()) # Convert back to list of dicts
 
@@ -307,11 +414,9 @@ def update_note(
             return None
 
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE") # Read the latest version and write the new one in one write transaction
 
-        cursor.execute(
-            "SELECT note_id, content, properties_json FROM notes WHERE original_note_id = ? AND is_latest_version = 1",
-            (original_note_id_to_update,)
-        )
+        cursor.execute(SELECT_LATEST_VERSION_WITH_TAGS_SQL, (original_note_id_to_update,))
         current_latest_note = cursor.fetchone()
 
         if not current_latest_note:
@@ -322,12 +427,8 @@ def update_note(
         current_content = current_latest_note['content']
         current_properties_json = current_latest_note['properties_json']
 
-        # Fetch current tags in the new format (type, value)
-        cursor.execute(
-            "SELECT t.tag_type, t.tag_value FROM tags t JOIN note_tags nt ON t.tag_id = nt.tag_id WHERE nt.note_version_id = ?",
-            (current_latest_note_id,)
-        )
-        current_tags_tuples = {(row['tag_type'], row['tag_value']) for row in cursor.fetchall()} # Use a set for efficient add
+        # Current tags in the new format (type, value), fetched with the note row
+        current_tags_tuples = {tuple(tag) for tag in json.loads(current_latest_note['tags_json'])} # Use a set for efficient add
 
         content_for_new_version = new_content if new_content is not None else current_content
         
@@ -359,9 +460,6 @@ def update_note(
         else: # No current and no new, so empty
             properties_for_new_version_json = json.dumps({}) 
 
-        # Start transaction explicitly if not already started by sqlite3 module on DML
-        # cursor.execute("BEGIN TRANSACTION") # Or rely on commit/rollback
-
         cursor.execute(
             "UPDATE notes SET is_latest_version = 0 WHERE note_id = ?",
             (current_latest_note_id,)
@@ -382,19 +480,7 @@ def update_note(
         # if tags_for_new_version_tuples is None: # This check is not strictly needed due to above logic but safe
         #     tags_for_new_version_tuples = [] 
         
-        for tag_type, tag_value in tags_for_new_version_tuples:
-            # Value already checked for emptiness above
-            cursor.execute("INSERT OR IGNORE INTO tags (tag_type, tag_value) VALUES (?, ?)", (tag_type, tag_value))
-            cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-            tag_row = cursor.fetchone()
-            if tag_row:
-                tag_id = tag_row['tag_id']
-                cursor.execute(
-                    "INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)",
-                    (new_version_note_id, tag_id)
-                )
-            else:
-                print(f"Warning: Could not find or create tag_id for tag_type='{tag_type}', tag_value='{tag_value}' in update_note", file=sys.stderr)
+        _link_tags_to_note_version(cursor, new_version_note_id, tags_for_new_version_tuples, "update_note")
 
         conn.commit()
         return new_version_note_id
@@ -427,12 +513,10 @@ def add_tag_to_note(original_note_id: int, tag_to_add: str) -> Optional[int]:
             return None
 
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE") # Read the latest version and write the new one in one write transaction
 
         # Get current latest version details
-        cursor.execute(
-            "SELECT note_id, content, properties_json FROM notes WHERE original_note_id = ? AND is_latest_version = 1 AND is_deleted = 0",
-            (original_note_id,)
-        )
+        cursor.execute(SELECT_ACTIVE_LATEST_VERSION_WITH_TAGS_SQL, (original_note_id,))
         current_latest_note = cursor.fetchone()
 
         if not current_latest_note:
@@ -443,12 +527,8 @@ def add_tag_to_note(original_note_id: int, tag_to_add: str) -> Optional[int]:
         current_content = current_latest_note['content']
         current_properties_json = current_latest_note['properties_json']
 
-        # Get current tags as (type, value) tuples
-        cursor.execute(
-            "SELECT t.tag_type, t.tag_value FROM tags t JOIN note_tags nt ON t.tag_id = nt.tag_id WHERE nt.note_version_id = ?",
-            (current_latest_note_id,)
-        )
-        current_tags_tuples = {(row['tag_type'], row['tag_value']) for row in cursor.fetchall()} # Use a set for efficient add
+        # Current tags as (type, value) tuples, fetched with the note row
+        current_tags_tuples = {tuple(tag) for tag in json.loads(current_latest_note['tags_json'])} # Use a set for efficient add
 
         # Parse the new tag to add
         tag_type_to_add, tag_value_to_add = _parse_tag_string(tag_to_add)
@@ -481,20 +561,7 @@ def add_tag_to_note(original_note_id: int, tag_to_add: str) -> Optional[int]:
             return None
 
         # Add all tags (current + new) to the new version
-        for tag_type, tag_value in tags_for_new_version_tuples:
-            # Tag type/value are already parsed and validated for emptiness (value part)
-            cursor.execute("INSERT OR IGNORE INTO tags (tag_type, tag_value) VALUES (?, ?)", (tag_type, tag_value))
-            cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-            tag_row = cursor.fetchone()
-            if tag_row:
-                tag_id = tag_row['tag_id']
-                cursor.execute(
-                    "INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)",
-                    (new_version_note_id, tag_id)
-                )
-            else:
-                # This should ideally not happen if INSERT OR IGNORE worked
-                print(f"Warning: Could not find or create tag_id for tag_type='{tag_type}', tag_value='{tag_value}' in add_tag_to_note", file=sys.stderr)
+        _link_tags_to_note_version(cursor, new_version_note_id, tags_for_new_version_tuples, "add_tag_to_note")
 
         conn.commit()
         return new_version_note_id
@@ -524,12 +591,10 @@ def remove_tag_from_note(original_note_id: int, tag_to_remove: str) -> Optional[
             return None
 
         cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE") # Read the latest version and write the new one in one write transaction
 
         # Get current latest version details
-        cursor.execute(
-            "SELECT note_id, content, properties_json FROM notes WHERE original_note_id = ? AND is_latest_version = 1 AND is_deleted = 0",
-            (original_note_id,)
-        )
+        cursor.execute(SELECT_ACTIVE_LATEST_VERSION_WITH_TAGS_SQL, (original_note_id,))
         current_latest_note = cursor.fetchone()
 
         if not current_latest_note:
@@ -540,12 +605,8 @@ def remove_tag_from_note(original_note_id: int, tag_to_remove: str) -> Optional[
         current_content = current_latest_note['content']
         current_properties_json = current_latest_note['properties_json']
 
-        # Get current tags as (type, value) tuples
-        cursor.execute(
-            "SELECT t.tag_type, t.tag_value FROM tags t JOIN note_tags nt ON t.tag_id = nt.tag_id WHERE nt.note_version_id = ?",
-            (current_latest_note_id,)
-        )
-        current_tags_tuples_set = {(row['tag_type'], row['tag_value']) for row in cursor.fetchall()} # Use a set for efficient removal
+        # Current tags as (type, value) tuples, fetched with the note row
+        current_tags_tuples_set = {tuple(tag) for tag in json.loads(current_latest_note['tags_json'])} # Use a set for efficient removal
 
         # Parse the tag to remove
         tag_type_to_remove, tag_value_to_remove = _parse_tag_string(tag_to_remove)
@@ -582,19 +643,7 @@ def remove_tag_from_note(original_note_id: int, tag_to_remove: str) -> Optional[
             return None
 
         # Add remaining tags to the new version
-        for tag_type, tag_value in tags_for_new_version_tuples:
-            # Tag type/value are already parsed
-            cursor.execute("INSERT OR IGNORE INTO tags (tag_type, tag_value) VALUES (?, ?)", (tag_type, tag_value))
-            cursor.execute("SELECT tag_id FROM tags WHERE tag_type = ? AND tag_value = ?", (tag_type, tag_value))
-            tag_row = cursor.fetchone()
-            if tag_row:
-                tag_id = tag_row['tag_id']
-                cursor.execute(
-                    "INSERT INTO note_tags (note_version_id, tag_id) VALUES (?, ?)",
-                    (new_version_note_id, tag_id)
-                )
-            else:
-                print(f"Warning: Could not find or create tag_id for tag_type='{tag_type}', tag_value='{tag_value}' in remove_tag_from_note", file=sys.stderr)
+        _link_tags_to_note_version(cursor, new_version_note_id, tags_for_new_version_tuples, "remove_tag_from_note")
 
         conn.commit()
         return new_version_note_id
@@ -829,11 +878,37 @@ def get_deleted_notes() -> List[Dict[str, any]]:
             conn.close()
     return deleted_notes_found
 
-def purge_deleted_notes(older_than_days: Optional[int] = None) -> int:
+def has_soft_deleted_notes() -> bool:
+    """
+    Cheap existence check for soft-deleted notes (latest version marked deleted).
+    Uses the (is_latest_version, is_deleted, ...) index and stops at the first match.
+    Returns True if at least one exists; on error returns True so callers do not skip a purge.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            print("Database connection not available in has_soft_deleted_notes.", file=sys.stderr)
+            return True
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM notes WHERE is_latest_version = 1 AND is_deleted = 1 LIMIT 1")
+        return cursor.fetchone() is not None
+    except sqlite3.Error as e:
+        print(f"Database error in has_soft_deleted_notes: {e}", file=sys.stderr)
+        return True
+    finally:
+        if conn:
+            conn.close()
+
+PURGE_BATCH_SIZE = 500
+
+def purge_deleted_notes(older_than_days: Optional[int] = None, batch_size: int = PURGE_BATCH_SIZE) -> int:
     """
     Permanently deletes notes that have been soft-deleted.
     If older_than_days is specified, only notes soft-deleted longer than that period are purged.
     When a note (original_note_id) is purged, ALL its versions are deleted.
+    Lineages are deleted batch_size at a time, committing after each batch so the
+    write lock is never held for the whole purge.
     Returns the number of original notes (lineages) purged.
     """
     conn = None
@@ -867,34 +942,25 @@ def purge_deleted_notes(older_than_days: Optional[int] = None) -> int:
             # print("No notes found meeting purge criteria.", file=sys.stdout) # Or use logger
             return 0
 
-        # For each original_note_id, delete all its versions and associated tags
-        # It's crucial to handle foreign key constraints if ON DELETE CASCADE is not set up
-        # or to delete from child tables first.
-        # SQLite by default does not enforce foreign keys unless PRAGMA foreign_keys = ON;
-        # Assuming we need to manually delete from note_tags.
-
-        for original_id in original_ids_to_purge:
-            if original_id is None: # Should not happen if data is consistent
-                continue
+        original_ids_to_purge = [original_id for original_id in original_ids_to_purge if original_id is not None]
+        batch_size = max(1, batch_size)
 
-            # Get all note_ids (versions) for this original_id
-            cursor.execute("SELECT note_id FROM notes WHERE original_note_id = ?", (original_id,))
-            note_versions_to_delete = [row['note_id'] for row in cursor.fetchall()]
+        # SQLite does not enforce foreign keys unless PRAGMA foreign_keys = ON,
+        # so note_tags rows for every version are deleted explicitly before the notes.
+        for batch_start in range(0, len(original_ids_to_purge), batch_size):
+            batch_ids = original_ids_to_purge[batch_start:batch_start + batch_size]
+            placeholders = ','.join('?' for _ in batch_ids)
 
-            if not note_versions_to_delete:
-                continue
+            cursor.execute(f"""
+                DELETE FROM note_tags WHERE note_version_id IN (
+                    SELECT note_id FROM notes WHERE original_note_id IN ({placeholders})
+                )
+            """, batch_ids)
+            cursor.execute(f"DELETE FROM notes WHERE original_note_id IN ({placeholders})", batch_ids)
+            conn.commit()
 
-            # Delete from note_tags for all these versions
-            # Using a placeholder for a list of IDs
-            placeholders = ','.join('?' for _ in note_versions_to_delete)
-            cursor.execute(f"DELETE FROM note_tags WHERE note_version_id IN ({placeholders})", note_versions_to_delete)
-            
-            # Delete all versions from notes table
-            cursor.execute("DELETE FROM notes WHERE original_note_id = ?", (original_id,))
-            
-            purged_original_notes_count +=1
+            purged_original_notes_count += len(batch_ids)
 
-        conn.commit()
         return purged_original_notes_count
 
     except sqlite3.Error as e:
@@ -1047,7 +1113,7 @@ def import_notes_from_json_data(data_to_import: Dict[str, any]) -> bool:
         cursor = conn.cursor()
 
         # Turn off foreign keys to allow inserting with specific IDs and in any order temporarily
-        cursor.execute("PRAGMA foreign_keys = OFF;")
+        conn.set_foreign_keys(False)
 
         # 1. Import tags
         # Assumes tag_id is INTEGER PRIMARY KEY and can be set if table is empty or ID doesn't exist.
@@ -1117,7 +1183,7 @@ def import_notes_from_json_data(data_to_import: Dict[str, any]) -> bool:
         conn.commit()
 
         # Turn foreign keys back on
-        cursor.execute("PRAGMA foreign_keys = ON;")
+        conn.set_foreign_keys(True)
         # Verify foreign keys are now enforced (optional check)
         # fk_check_cursor = conn.cursor()
         # fk_check_cursor.execute("PRAGMA foreign_key_check;")
@@ -1153,8 +1219,7 @@ def import_notes_from_json_data(data_to_import: Dict[str, any]) -> bool:
         if conn:
             # Ensure foreign keys are attempted to be turned back on even if an error occurred before commit.
             try:
-                cursor = conn.cursor() # Re-obtain cursor if previous one is invalid
-                cursor.execute("PRAGMA foreign_keys = ON;")
+                conn.set_foreign_keys(True)
             except sqlite3.Error as fke:
                 print(f"Error trying to re-enable foreign keys: {fke}", file=sys.stderr)
             conn.close()
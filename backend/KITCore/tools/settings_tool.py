@@ -1,9 +1,9 @@
 import sqlite3
 import json
 import sys # For stderr printing, can be removed if logging is used exclusively
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List
 
-from ..database_manager import get_db_connection
+from ..database_manager import get_db_connection, GET_SETTING_SQL, UPSERT_SETTING_SQL
 
 # Default values for settings if not found in the database.
 # This can be expanded as more settings are defined.
@@ -16,6 +16,12 @@ DEFAULT_SETTINGS = {
     "last_auto_purge_date": "", # Stores YYYY-MM-DD of last auto purge
 }
 
+def _setting_value_to_str(key: str, value: Any) -> str:
+    """Converts a setting value to its stored string form."""
+    if value is None and key == "default_purge_days": # Special handling for nullable int
+        return "" # Store as empty string to represent None for int after retrieval
+    return str(value)
+
 def get_setting(key: str, default_override: Optional[Any] = None) -> Optional[Any]:
     """
     Retrieves a setting value from the user_settings table.
@@ -41,7 +47,7 @@ def get_setting(key: str, default_override: Optional[Any] = None) -> Optional[An
             return DEFAULT_SETTINGS.get(key)
 
         cursor = conn.cursor()
-        cursor.execute("SELECT setting_value FROM user_settings WHERE setting_key = ?", (key,))
+        cursor.execute(GET_SETTING_SQL, (key,))
         row = cursor.fetchone()
 
         if row:
@@ -78,6 +84,56 @@ def get_setting(key: str, default_override: Optional[Any] = None) -> Optional[An
         if conn:
             conn.close()
 
+def get_settings(keys: List[str]) -> Dict[str, Any]:
+    """
+    Retrieves several settings with a single query against the user_settings table.
+    Applies the same type conversion and default fallback as get_setting.
+
+    Args:
+        keys: The names of the settings to retrieve.
+
+    Returns:
+        A dictionary mapping every requested key to its value
+        (or its DEFAULT_SETTINGS value / None if not stored).
+    """
+    settings_found: Dict[str, Any] = {key: DEFAULT_SETTINGS.get(key) for key in keys}
+    if not keys:
+        return settings_found
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            print(f"Database connection not available in get_settings. Returning defaults.", file=sys.stderr)
+            return settings_found
+
+        placeholders = ', '.join('?' * len(keys))
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT setting_key, setting_value FROM user_settings WHERE setting_key IN ({placeholders})",
+            tuple(keys)
+        )
+        for row in cursor.fetchall():
+            key, value_str = row['setting_key'], row['setting_value']
+            if key == "default_purge_days":
+                try:
+                    settings_found[key] = int(value_str) if value_str else None
+                except ValueError:
+                    print(f"Warning: Could not convert setting '{key}' value '{value_str}' to int in get_settings. Using default.", file=sys.stderr)
+            else:
+                settings_found[key] = value_str
+        return settings_found
+
+    except sqlite3.Error as e:
+        print(f"Database error in get_settings for keys {keys}: {e}", file=sys.stderr)
+        return settings_found
+    except Exception as e:
+        print(f"Unexpected error in get_settings for keys {keys}: {e}", file=sys.stderr)
+        return settings_found
+    finally:
+        if conn:
+            conn.close()
+
 def set_setting(key: str, value: Any) -> bool:
     """
     Sets or updates a setting in the user_settings table.
@@ -99,15 +155,7 @@ def set_setting(key: str, value: Any) -> bool:
         
         cursor = conn.cursor()
         # Convert value to string for consistent storage.
-        # Specific type handling (like for 'None' for default_purge_days) can be done here or before calling.
-        value_str = str(value)
-        if value is None and key == "default_purge_days": # Special handling for nullable int
-             value_str = "" # Store as empty string to represent None for int after retrieval
-
-        cursor.execute(
-            "INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)",
-            (key, value_str)
-        )
+        cursor.execute(UPSERT_SETTING_SQL, (key, _setting_value_to_str(key, value)))
         conn.commit()
         return cursor.rowcount > 0
 
@@ -125,6 +173,45 @@ def set_setting(key: str, value: Any) -> bool:
         if conn:
             conn.close()
 
+def set_settings(items: Dict[str, Any]) -> bool:
+    """
+    Sets or updates several settings in one transaction.
+    Values are stored as strings, as with set_setting.
+
+    Args:
+        items: A dictionary mapping setting names to their new values.
+
+    Returns:
+        True if all settings were successfully set, False otherwise (no setting is changed on failure).
+    """
+    if not items:
+        return True
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            print(f"Database connection not available in set_settings.", file=sys.stderr)
+            return False
+
+        conn.executemany(UPSERT_SETTING_SQL, [(key, _setting_value_to_str(key, value)) for key, value in items.items()])
+        conn.commit()
+        return True
+
+    except sqlite3.Error as e:
+        print(f"Database error in set_settings for keys {list(items)}: {e}", file=sys.stderr)
+        if conn:
+            conn.rollback()
+        return False
+    except Exception as e:
+        print(f"Unexpected error in set_settings for keys {list(items)}: {e}", file=sys.stderr)
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
 def list_settings() -> Dict[str, Any]:
     """
     Retrieves all settings stored in the user_settings table.
@@ -1,3 +1,4 @@
 MAX_BACKEND_LOG_FILES = 5
 MAX_AISERVICE_LOG_FILES = 5
-MAX_LOG_SIZE_MB = 10  # Max size in Megabytes for a single log file before rotation (if applicable) 
\ No newline at end of file
+MAX_LOG_SIZE_MB = 10  # Max size in Megabytes for a single log file before rotation (if applicable) 
+MAX_CONVERSATION_HISTORY_TURNS = 20  # Most recent user/model exchanges forwarded to Gemini with each AI query
@@ -35,7 +35,7 @@ from KITCore.tools.settings_tool import get_setting as kit_get_setting
 from api.services.note_service import NoteService
 from api.services.tag_service import TagService
 from api.services.settings_service import SettingsService
-from ..config_settings import MAX_AISERVICE_LOG_FILES # Added
+from ..config_settings import MAX_AISERVICE_LOG_FILES, MAX_CONVERSATION_HISTORY_TURNS # Added
 
 # Configure logging for this module (used for pre-init or static method logging if any)
 module_logger = logging.getLogger(__name__) # Renamed to avoid confusion with self.agent_logger
@@ -197,6 +197,10 @@ class AIService:
             
             full_conversation_for_gemini = []
             if conversation_history:
+                # Only the most recent turns are sent, so prompt size and token cost stay bounded in long sessions
+                max_history_entries = MAX_CONVERSATION_HISTORY_TURNS * 2
+                if len(conversation_history) > max_history_entries:
+                    conversation_history = conversation_history[-max_history_entries:]
                 for entry in conversation_history:
                     # Filter out previous "No response text found." from the model
                     if not (entry.get("role") == "model" and entry.get("text") == "No response text found."):
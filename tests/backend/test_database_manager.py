@@ -0,0 +1,142 @@
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from KITCore.database_manager import (
+    create_tables, get_db_connection, close_all_db_connections, upgrade_schema, notes_fts_enabled, GET_SETTING_SQL
+)
+
+class TestDatabaseManager(unittest.TestCase):
+    def setUp(self):
+        self._original_env_var = os.environ.get('KIT_TEST_DB_PATH')
+        handle = tempfile.NamedTemporaryFile(suffix=".db", prefix="test_dbm_", delete=False)
+        self.db_path = handle.name
+        handle.close()
+        os.environ['KIT_TEST_DB_PATH'] = self.db_path
+        self.assertTrue(create_tables())
+
+    def tearDown(self):
+        close_all_db_connections()
+        for path in (self.db_path, self.db_path + "-wal", self.db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        if self._original_env_var is not None:
+            os.environ['KIT_TEST_DB_PATH'] = self._original_env_var
+        elif 'KIT_TEST_DB_PATH' in os.environ:
+            del os.environ['KIT_TEST_DB_PATH']
+
+    def test_connection_reused_within_thread(self):
+        conn1 = get_db_connection()
+        conn1.close()
+        conn2 = get_db_connection()
+        self.assertIs(conn1, conn2)
+        # close() keeps the connection usable for the next caller
+        self.assertEqual(conn2.execute("SELECT COUNT(*) FROM user_settings").fetchone()[0], 0)
+        conn2.close()
+
+    def test_close_rolls_back_uncommitted_changes(self):
+        conn = get_db_connection()
+        conn.execute("INSERT INTO user_settings (setting_key, setting_value) VALUES ('k', 'v')")
+        conn.close()
+        conn = get_db_connection()
+        self.assertIsNone(conn.execute("SELECT setting_value FROM user_settings WHERE setting_key = 'k'").fetchone())
+        conn.close()
+
+    def test_close_resets_foreign_keys_only_when_changed(self):
+        conn = get_db_connection()
+        conn.set_foreign_keys(True)
+        conn.close()
+        conn = get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 0)
+        # Enforcement turned on without set_foreign_keys() is left to the code that turned it on
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.close()
+        conn = get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        conn.execute("PRAGMA foreign_keys = OFF;")
+        conn.close()
+
+    def test_separate_connection_per_thread(self):
+        main_conn = get_db_connection()
+        other = []
+        worker = threading.Thread(target=lambda: other.append(get_db_connection()))
+        worker.start()
+        worker.join()
+        self.assertIsNotNone(other[0])
+        self.assertIsNot(main_conn, other[0])
+
+    def test_reopens_when_database_file_replaced(self):
+        conn1 = get_db_connection()
+        os.remove(self.db_path)
+        self.assertTrue(create_tables())
+        conn2 = get_db_connection()
+        self.assertIsNot(conn1, conn2)
+
+    def test_new_connections_use_wal(self):
+        conn = get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1) # NORMAL
+        conn.close()
+
+    def test_get_setting_reads_only_the_primary_key(self):
+        conn = get_db_connection()
+        plan = " ".join(row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + GET_SETTING_SQL, ("k",)))
+        conn.close()
+        self.assertIn("USING PRIMARY KEY (setting_key=?)", plan)
+
+    def _use_older_database(self):
+        """Switches the test to a database with the notes table and index of an older create_tables()."""
+        os.remove(self.db_path)
+        # A new path, so the pooled connection to the removed file is not reused even if its inode is
+        self.db_path = self.db_path[:-len(".db")] + "_old.db"
+        os.environ['KIT_TEST_DB_PATH'] = self.db_path
+        old_conn = sqlite3.connect(self.db_path)
+        old_conn.executescript(
+            "CREATE TABLE notes (note_id INTEGER PRIMARY KEY AUTOINCREMENT, original_note_id INTEGER, content TEXT NOT NULL,"
+            " created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, is_latest_version BOOLEAN NOT NULL, properties_json TEXT,"
+            " is_deleted BOOLEAN DEFAULT 0 NOT NULL, deleted_at TIMESTAMP);"
+            "CREATE INDEX idx_notes_original_note_id ON notes (original_note_id);"
+            "INSERT INTO notes (original_note_id, content, is_latest_version) VALUES (1, 'Existing note text', 1);"
+        )
+        old_conn.close()
+
+    def test_upgrade_schema_replaces_older_indexes(self):
+        self._use_older_database()
+
+        conn = get_db_connection()
+        # Connecting alone leaves the schema as it is
+        self.assertIn("idx_notes_original_note_id", {row["name"] for row in conn.execute("PRAGMA index_list(notes)")})
+        conn.close()
+
+        self.assertTrue(upgrade_schema())
+        conn = get_db_connection()
+        indexes = {row["name"] for row in conn.execute("PRAGMA index_list(notes)")}
+        plan = " ".join(row["detail"] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT note_id FROM notes WHERE original_note_id IN (?, ?) AND is_latest_version = 1 AND is_deleted = 0", (1, 2)))
+        conn.close()
+        self.assertNotIn("idx_notes_original_note_id", indexes)
+        self.assertIn("USING COVERING INDEX idx_notes_original_latest_deleted", plan)
+
+    def test_upgrade_schema_builds_search_index(self):
+        self._use_older_database()
+
+        conn = get_db_connection()
+        self.assertFalse(notes_fts_enabled(conn)) # Connecting alone does not build it
+        conn.close()
+
+        self.assertTrue(upgrade_schema())
+        conn = get_db_connection()
+        self.assertTrue(notes_fts_enabled(conn))
+        matches = conn.execute("SELECT rowid FROM notes_fts WHERE notes_fts MATCH '\"note text\"'").fetchall()
+        conn.close()
+        self.assertEqual([row[0] for row in matches], [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from KIT.KIT import plan_action_waves
+
+def _actions(*commands):
+    return [{"intent": "test", "kit_core_command": command} for command in commands]
+
+class TestPlanActionWaves(unittest.TestCase):
+    def test_consecutive_reads_share_a_wave(self):
+        self.assertEqual(plan_action_waves(_actions("find", "history", "list-all-tags")), [[0, 1, 2]])
+
+    def test_writes_get_their_own_waves(self):
+        waves = plan_action_waves(_actions("find", "add", "find", "find", "update", "add-tag"))
+        self.assertEqual(waves, [[0], [1], [2, 3], [4], [5]])
+
+    def test_exports_run_serially(self):
+        # export-notes writes a file, so it never shares a wave with another export or a read
+        waves = plan_action_waves(_actions("export-notes", "export-notes", "find", "export-notes"))
+        self.assertEqual(waves, [[0], [1], [2], [3]])
+
+    def test_action_without_command_is_its_own_wave(self):
+        actions = _actions("find") + [{"intent": "GREETING", "response_text": "Hi"}] + _actions("find")
+        self.assertEqual(plan_action_waves(actions), [[0], [1], [2]])
+
+if __name__ == '__main__':
+    unittest.main()
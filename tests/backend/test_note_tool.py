@@ -12,10 +12,10 @@ if PROJECT_ROOT not in sys.path:
 
 # Now that PROJECT_ROOT is in sys.path and KITCore is a package, these should work:
 from config import KIT_DATABASE_PATH, KIT_DATABASE_DIR # config.py is at PROJECT_ROOT
-from KITCore.database_manager import create_tables, get_db_connection
+from KITCore.database_manager import create_tables, get_db_connection, close_all_db_connections
 from KITCore.tools.note_tool import (
     create_note, find_notes, update_note, get_note_history,
-    soft_delete_note, restore_note, get_deleted_notes, purge_deleted_notes, # Added soft delete functions
+    soft_delete_note, restore_note, get_deleted_notes, purge_deleted_notes, has_soft_deleted_notes, # Added soft delete functions
     export_all_notes, import_notes_from_json_data, # Added export/import functions
     add_tag_to_note, remove_tag_from_note, list_all_tags # Added list_all_tags
 )
@@ -49,6 +49,7 @@ class TestNoteTool(unittest.TestCase):
     def tearDownClass(cls):
         """Clean up the temporary database and restore environment."""
         if cls._test_db_path:
+            close_all_db_connections() # Checkpoints the WAL so no -wal/-shm files are left behind
             # print(f"DEBUG TestNoteTool: Removing test DB: {cls._test_db_path}") # For test debugging
             try:
                 os.remove(cls._test_db_path)
@@ -98,6 +99,22 @@ class TestNoteTool(unittest.TestCase):
         self.assertEqual(note_row['original_note_id'], note_id)
         self.assertEqual(note_row['is_latest_version'], 1)
 
+    def test_create_note_after_purge_is_its_own_original(self):
+        first_id = create_note(content="Will be purged")
+        soft_delete_note(first_id)
+        purge_deleted_notes()
+        # AUTOINCREMENT does not reuse the purged ID, and original_note_id must follow the ID actually assigned
+        note_id = create_note(content="Created after purge")
+        self.assertGreater(note_id, first_id)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT original_note_id FROM notes WHERE note_id = ?", (note_id,))
+        note_row = cursor.fetchone()
+        conn.close()
+
+        self.assertEqual(note_row['original_note_id'], note_id)
+
     def test_create_note_with_tags(self):
         tags = ["python", "testing", "  ExampleTag  "]
         note_id = create_note(content="Note with tags.", tags_list=tags)
@@ -166,6 +183,19 @@ class TestNoteTool(unittest.TestCase):
         self.assertEqual(len(orange_notes), 1)
         self.assertEqual(orange_notes[0]['content'], "This is about apples and oranges.")
     
+    def test_find_notes_by_content_keyword_substring_and_short(self):
+        create_note(content="Pineapple pizza, 100% of the time")
+        create_note(content="An apple a day")
+        old_id = create_note(content="Old apple text")
+        update_note(old_id, new_content="Rewritten")
+
+        # Indexed keywords match case-insensitive substrings; short and wildcard keywords still work
+        self.assertEqual(len(find_notes(content_keywords=["APPLE"])), 2)
+        self.assertEqual(len(find_notes(content_keywords=["apple", "a"])), 2)
+        self.assertEqual(len(find_notes(content_keywords=["100%"])), 1)
+        self.assertEqual(len(find_notes(content_keywords=["old apple"])), 0) # Only latest versions are searched
+        self.assertEqual(len(find_notes(content_keywords=["rewritten"])), 1)
+
     def test_find_notes_by_tag_and_content(self):
         create_note(content="Learning Python for scripting", tags_list=["python", "scripting"])
         create_note(content="Python for data science", tags_list=["python", "data"])
@@ -825,6 +855,34 @@ class TestNoteTool(unittest.TestCase):
         self.assertEqual(len(all_remaining_notes), 1)
         self.assertEqual(all_remaining_notes[0]['original_note_id'], note3_id)
 
+    def test_has_soft_deleted_notes(self):
+        note_id = create_note(content="Existence check note")
+        self.assertFalse(has_soft_deleted_notes())
+        soft_delete_note(note_id)
+        self.assertTrue(has_soft_deleted_notes())
+        restore_note(note_id)
+        self.assertFalse(has_soft_deleted_notes())
+
+    def test_purge_deleted_notes_in_batches(self):
+        """Test that purging in small batches still removes every deleted lineage and its tags."""
+        deleted_ids = [create_note(content=f"Batch purge {i}", tags_list=["batch_purge"]) for i in range(5)]
+        kept_id = create_note(content="Batch keep", tags_list=["batch_purge"])
+        for note_id in deleted_ids:
+            soft_delete_note(note_id)
+
+        purged_count = purge_deleted_notes(batch_size=2)
+        self.assertEqual(purged_count, 5)
+        self.assertEqual(len(get_deleted_notes()), 0)
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT original_note_id FROM notes")
+        remaining_ids = [row['original_note_id'] for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(*) FROM note_tags WHERE note_version_id NOT IN (SELECT note_id FROM notes)")
+        orphaned_tag_links = cursor.fetchone()[0]
+        conn.close()
+        self.assertEqual(remaining_ids, [kept_id])
+        self.assertEqual(orphaned_tag_links, 0)
 
     def test_purge_deleted_notes_older_than_days(self):
         """Test purging soft-deleted notes older than a specific number of days."""
@@ -0,0 +1,46 @@
+import unittest
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from KIT.response_cache import GeminiResponseCache, is_cacheable_response, normalize_query
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        # No embedding model: exercise the exact-match path deterministically.
+        self.cache = GeminiResponseCache(max_entries=2, embedding_model_name=None)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  How do I   ADD a tag?? "), "how do i add a tag")
+
+    def test_get_and_put(self):
+        self.assertIsNone(self.cache.get("help"))
+        self.cache.put("Help", '{"intent": "SHOW_HELP"}')
+        self.assertEqual(self.cache.get("help!"), '{"intent": "SHOW_HELP"}')
+
+    def test_same_query_in_different_context_misses(self):
+        self.cache.put("how do I do that", "Use add-tag.", context="user: how do I tag a note")
+        self.assertIsNone(self.cache.get("how do I do that", context="user: how do I restore a note"))
+        self.assertIsNone(self.cache.get("how do I do that"))
+        self.assertEqual(self.cache.get("How do I do that?", context="user: how do I tag a note"), "Use add-tag.")
+
+    def test_lru_eviction(self):
+        self.cache.put("first", "1")
+        self.cache.put("second", "2")
+        self.cache.get("first") # "second" is now least recently used
+        self.cache.put("third", "3")
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get("second"))
+        self.assertEqual(self.cache.get("first"), "1")
+
+    def test_is_cacheable_response(self):
+        self.assertTrue(is_cacheable_response({"intent": "SHOW_HELP"}))
+        self.assertTrue(is_cacheable_response({"intent": "ANSWER_FROM_HELP_CONTENT_REQUEST", "response_text": "How do I add?"}))
+        self.assertFalse(is_cacheable_response({"intent": "find_notes", "kit_core_command": "find"}))
+        self.assertFalse(is_cacheable_response({"intent": "GREETING", "response_text": "Hi!"}))
+
+if __name__ == '__main__':
+    unittest.main()
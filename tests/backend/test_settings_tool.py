@@ -8,10 +8,12 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-from KITCore.database_manager import create_tables, get_db_connection
+from KITCore.database_manager import create_tables, get_db_connection, close_all_db_connections
 from KITCore.tools.settings_tool import (
     get_setting,
+    get_settings,
     set_setting,
+    set_settings,
     list_settings,
     delete_setting,
     DEFAULT_SETTINGS
@@ -35,6 +37,7 @@ class TestSettingsTool(unittest.TestCase):
     @classmethod
     def tearDownClass(cls):
         if cls._test_db_path:
+            close_all_db_connections() # Checkpoints the WAL so no -wal/-shm files are left behind
             try:
                 os.remove(cls._test_db_path)
             except OSError as e:
@@ -94,6 +97,26 @@ class TestSettingsTool(unittest.TestCase):
         self.assertEqual(row['setting_value'], "")
         conn.close()
 
+    def test_get_settings_batch(self):
+        set_setting("user_name", "Alice")
+        set_setting("default_purge_days", 14)
+
+        settings = get_settings(["user_name", "default_purge_days", "ai_model_preference", "non_existent_key"])
+        self.assertEqual(settings["user_name"], "Alice")
+        self.assertEqual(settings["default_purge_days"], 14)
+        self.assertEqual(settings["ai_model_preference"], DEFAULT_SETTINGS["ai_model_preference"])
+        self.assertIsNone(settings["non_existent_key"])
+        self.assertEqual(get_settings([]), {})
+
+    def test_set_settings_batch(self):
+        set_setting("user_name", "Alice")
+        self.assertTrue(set_settings({"user_name": "Bob", "default_purge_days": None, "ai_model_preference": "gemini-pro"}))
+        settings = get_settings(["user_name", "default_purge_days", "ai_model_preference"])
+        self.assertEqual(settings["user_name"], "Bob")
+        self.assertIsNone(settings["default_purge_days"])
+        self.assertEqual(settings["ai_model_preference"], "gemini-pro")
+        self.assertTrue(set_settings({}))
+
     def test_set_setting_invalid_key_still_stores_if_not_checked_in_tool(self):
         # The settings_tool.set_setting itself does not validate keys against DEFAULT_SETTINGS
         # Key validation is expected at a higher level (e.g., CLI handler)